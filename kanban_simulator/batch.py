@@ -0,0 +1,335 @@
+"""A vectorised simulator that runs many trials of simple boards at once
+using NumPy (which must be installed to use this module).
+
+Supported boards have one or more lanes made of plain `Column` and
+`QueueColumn` instances, all pulling from the board's backlog, and cards that
+don't split. For these boards a trial is pure integer bookkeeping, so all
+trials can be advanced together, one day at a time, as array operations.
+
+Touch times that are numbers are used as-is. Callable touch times are
+called once per card, column and trial before the simulation starts, so
+they should not depend on the state of the card. Touch times that are
+distributions (see `kanban_simulator.distributions`) are sampled for all
+cards at once.
+
+Use `simulate()` to run a board, falling back to the object engine for
+boards that are not supported, or `BatchSimulator` to require a supported
+board.
+"""
+
+import random
+import warnings
+import collections
+
+import numpy as np
+
+from kanban_simulator import board as kb
+from kanban_simulator import montecarlo
+from kanban_simulator import distributions
+
+
+class UnsupportedBoard(ValueError):
+    """The board uses features the batch simulator can't handle
+    """
+
+
+BatchResult = collections.namedtuple('BatchResult', ['days', 'cycle_times', 'cards', 'seeds'])
+BatchResult.__doc__ = """Results of a batch of trials:
+
+days:        array of the finish day of each trial
+cycle_times: array of shape (trials, cards) with the age of each backlog card
+             when it reached the done log in each trial
+cards:       list of the names of the backlog cards, in backlog order
+seeds:       list of the seed used for each trial
+"""
+
+
+def simulate(board, trials=100, seed=None, max_days=100000, fallback=True):
+    """Run `trials` trials of `board` and return a `BatchResult`.
+
+    If the board can't be run by the batch simulator and `fallback` is True,
+    a warning is issued and the trials are run by the object engine instead.
+    Otherwise, `UnsupportedBoard` is raised.
+    """
+
+    try:
+        simulator = BatchSimulator(board)
+    except UnsupportedBoard as e:
+        if not fallback:
+            raise
+        warnings.warn("Falling back to the object engine: %s" % e)
+        return _simulate_objects(board, trials, seed, max_days)
+
+    return simulator.run(trials, seed=seed, max_days=max_days)
+
+
+def _simulate_objects(board, trials, seed, max_days):
+    seeds = montecarlo.trial_seeds(seed, trials)
+    days = np.zeros(trials, dtype=np.int64)
+    cycle_times = np.zeros((trials, len(board.backlog.cards)), dtype=np.int64)
+
+    template = board.compile()
+
+    state = random.getstate()
+    try:
+        for t, trial_seed in enumerate(seeds):
+            random.seed(trial_seed)
+            trial_board = template.instantiate()
+            distributions.reseed(trial_board, trial_seed)
+            cards = list(trial_board.backlog.cards)
+            days[t], _ = trial_board.run_simulation(max_days=max_days)
+            cycle_times[t] = [c.age for c in cards]
+    finally:
+        random.setstate(state)
+
+    return BatchResult(days, cycle_times, [c.name for c in board.backlog.cards], seeds)
+
+
+class BatchSimulator(object):
+    """Runs trials of a supported board as NumPy array operations.
+
+    Raises `UnsupportedBoard` on construction if the board can't be
+    simulated this way.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.check(board)
+
+        self.cards = list(board.backlog.cards)
+        self.lanes = [list(lane.columns) for lane in board.lanes]
+        self.lane_wip_limits = [lane.wip_limit for lane in board.lanes]
+
+    @staticmethod
+    def check(board):
+        """Raise `UnsupportedBoard` if `board` can't be simulated in a batch
+        """
+
+        backlog = board.backlog
+        if (not isinstance(backlog, kb.QueueCardSource) or isinstance(backlog, kb.GeneratedBacklog) or
+                getattr(backlog, 'card_source', None) is not None):
+            raise UnsupportedBoard("the backlog must be a plain Backlog")
+
+        if any(not c.is_empty for l in board.lanes for c in l.columns):
+            raise UnsupportedBoard("the board already has cards in progress")
+
+        if len(board.donelog.cards) > 0 or any(len(l.donelog.cards) > 0 for l in board.lanes):
+            raise UnsupportedBoard("the board already has cards in a donelog")
+
+        for card in backlog.cards:
+            if isinstance(card, kb.Epic) and card.splits:
+                raise UnsupportedBoard("card %s splits into stories" % card.name)
+
+        for lane in board.lanes:
+            if lane.backlog is not backlog:
+                raise UnsupportedBoard("lane %s has its own backlog" % lane.name)
+
+            for column in lane.columns:
+                column_class = kb.base_class(column)
+                if column_class not in (kb.Column, kb.QueueColumn):
+                    raise UnsupportedBoard("column %s is a %s" % (column.name, column_class.__name__))
+
+                if column_class is kb.QueueColumn and column.touch != 0:
+                    raise UnsupportedBoard("queue column %s has a touch time" % column.name)
+
+                if column.card_type is not None and not all(isinstance(c, column.card_type) for c in backlog.cards):
+                    raise UnsupportedBoard("column %s only accepts some cards" % column.name)
+
+    def run(self, trials=100, seed=None, max_days=100000):
+        """Run `trials` trials and return a `BatchResult`.
+
+        Raises `OverflowError` if any trial takes more than `max_days` days.
+        """
+
+        seeds = montecarlo.trial_seeds(seed, trials)
+        state = _BatchState(self, trials, self._sample_touches(seeds))
+
+        while state.active.any():
+            state.day += 1
+            if state.day > max_days:
+                raise OverflowError
+
+            # The board's donelog pulls through each lane's donelog first,
+            # then each lane pulls from right to left
+            for l, columns in enumerate(self.lanes):
+                state.pull(l, len(columns))
+
+            for l, columns in enumerate(self.lanes):
+                for j in range(len(columns), -1, -1):
+                    state.pull(l, j)
+
+            state.finish_day()
+
+        return BatchResult(state.days, state.finish - state.start, [c.name for c in self.cards], seeds)
+
+    def _sample_touches(self, seeds):
+        """Return, for each lane and column, an array of shape
+        (trials, cards) of touch times.
+
+        Columns sharing a `touch` callable share the same samples: a card
+        only ever passes through one lane, so this does not correlate
+        anything within a trial.
+        """
+
+        trials, n = len(seeds), len(self.cards)
+
+        callables = []
+        for columns in self.lanes:
+            for column in columns:
+                if callable(column.touch) and not any(column.touch is c for c in callables):
+                    callables.append(column.touch)
+
+        samples = [np.zeros((trials, n)) for _ in callables]
+
+        # Distributions with their own generator are reseeded for each
+        # trial, as in `montecarlo.run_trial()`
+        seeded = [c for c in callables if isinstance(c, distributions.Distribution) and c.rng is not None]
+
+        state = random.getstate()
+        rng_states = [d.rng.getstate() for d in seeded]
+        try:
+            for t, seed in enumerate(seeds):
+                random.seed(seed)
+                for dist in seeded:
+                    dist.reseed(seed)
+
+                for touch, values in zip(callables, samples):
+                    if isinstance(touch, distributions.Distribution):
+                        values[t] = touch.sample(n)
+                    else:
+                        values[t] = [touch(card) for card in self.cards]
+        finally:
+            random.setstate(state)
+            for dist, rng_state in zip(seeded, rng_states):
+                dist.rng.setstate(rng_state)
+
+        touches = []
+        for columns in self.lanes:
+            lane_touches = []
+            for column in columns:
+                if callable(column.touch):
+                    lane_touches.append(next(v for c, v in zip(callables, samples) if c is column.touch))
+                else:
+                    lane_touches.append(np.broadcast_to(np.asarray(column.touch), (trials, n)))
+            touches.append(lane_touches)
+
+        return touches
+
+
+class _BatchState(object):
+    """The state of a batch of trials in progress.
+
+    For each lane, `orders[l]` holds the cards in the order they entered the
+    lane, and `passed[l][j]` the number of cards that have reached column
+    `j` or beyond (with `j == len(columns)` being the donelog). Cards never
+    overtake each other, so column `j` holds the cards at positions
+    `passed[l][j + 1]` to `passed[l][j] - 1` of `orders[l]`.
+    """
+
+    def __init__(self, simulator, trials, touches):
+        self.simulator = simulator
+        self.touches = touches
+        self.day = 0
+
+        n = self.n = len(simulator.cards)
+        self.rows = np.arange(trials)
+
+        self.next_card = np.zeros(trials, dtype=np.int64)  # index of next backlog card
+        self.enter = np.zeros((trials, n), dtype=np.int64)  # day each card entered its column
+        self.start = np.zeros((trials, n), dtype=np.int64)  # day each card left the backlog
+        self.finish = np.zeros((trials, n), dtype=np.int64)  # day each card reached a donelog
+        self.days = np.zeros(trials, dtype=np.int64)
+
+        self.orders = [np.zeros((trials, max(n, 1)), dtype=np.int64) for _ in simulator.lanes]
+        self.passed = [np.zeros((len(columns) + 1, trials), dtype=np.int64) for columns in simulator.lanes]
+
+        self.active = np.full(trials, n > 0)
+
+    def pull(self, l, j):
+        """Pull as many cards as possible into column `j` of lane `l` in
+        each active trial, like `Column.pull()` or `Donelog.pull()`.
+        """
+
+        columns = self.simulator.lanes[l]
+        lane_wip_limit = self.simulator.lane_wip_limits[l]
+        order, passed, rows, n = self.orders[l], self.passed[l], self.rows, self.n
+
+        while True:
+            source = self._resolve_source(columns, passed, j)
+
+            can_pull = self.active.copy()
+            if j < len(columns):
+                wip_limit = columns[j].wip_limit
+                if wip_limit is not None:
+                    can_pull &= (passed[j] - passed[j + 1]) < wip_limit
+
+                if j == 0 and lane_wip_limit is not None:
+                    can_pull &= (passed[0] - passed[-1]) < lane_wip_limit
+
+            card = np.zeros(len(rows), dtype=np.int64)
+            ready = np.zeros(len(rows), dtype=bool)
+
+            from_backlog = source == -1
+            card[from_backlog] = self.next_card[from_backlog]
+            ready[from_backlog] = self.next_card[from_backlog] < n
+
+            for s in np.unique(source[can_pull & ~from_backlog]):
+                here = source == s
+                head = order[rows[here], np.minimum(passed[s + 1][here], n - 1)]
+                age = self.day - self.enter[rows[here], head]
+                card[here] = head
+                ready[here] = (passed[s + 1][here] < passed[s][here]) & (age >= self.touches[l][s][rows[here], head])
+
+            move = can_pull & ready
+            if not move.any():
+                break
+
+            # Cards from the backlog join the lane...
+            joining = move & from_backlog
+            if joining.any():
+                order[rows[joining], passed[0][joining]] = card[joining]
+                self.start[rows[joining], card[joining]] = self.day
+                self.next_card[joining] += 1
+
+            # ...and all cards move past any (empty) columns up to this one
+            for k in range(j + 1):
+                passed[k][move & (source < k)] += 1
+
+            self.enter[rows[move], card[move]] = self.day
+            if j == len(columns):
+                self.finish[rows[move], card[move]] = self.day
+
+    @staticmethod
+    def _resolve_source(columns, lane_passed, j):
+        """Return an array with the index of the column each trial's column
+        `j` pulls from, or -1 for the backlog. Queue columns pass requests
+        on to their own source when they are empty.
+        """
+
+        source = np.full(lane_passed.shape[1], -1, dtype=np.int64)
+        undecided = np.ones(lane_passed.shape[1], dtype=bool)
+
+        for s in range(j - 1, -1, -1):
+            if type(columns[s]) is kb.QueueColumn:
+                found = undecided & (lane_passed[s + 1] < lane_passed[s])
+            else:
+                found = undecided
+
+            source[found] = s
+            undecided &= ~found
+
+            if not undecided.any():
+                break
+
+        return source
+
+    def finish_day(self):
+        """Record the finish day of trials where the board is now empty
+        """
+
+        done = self.active & (self.next_card == self.n)
+        for passed in self.passed:
+            done &= passed[0] == passed[-1]
+
+        self.days[done] = self.day
+        self.active &= ~done
@@ -0,0 +1,319 @@
+"""Benchmarks for the simulator, run on synthetic boards.
+
+`generate_board()` builds a board of a given size and shape. `SCENARIOS`
+describes a standard set of boards, and `run_suite()` measures each of
+them: simulated days per second, Monte Carlo trials per second, the time
+to clone the board and to build it from a `BoardTemplate`, and the peak
+memory allocated during one simulation.
+
+Results can be saved as JSON and compared against a saved baseline to
+catch regressions between versions::
+
+    python -m kanban_simulator.benchmark --save baseline.json
+    python -m kanban_simulator.benchmark --compare baseline.json
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import kanban_simulator.board as kb
+
+
+class Bug(kb.Card):
+    """A card type for boards with a mix of card types
+    """
+
+    __slots__ = ()
+
+
+def touch(card):
+    return random.randint(1, 5)
+
+
+def split(card):
+    return random.randint(2, 6)
+
+
+def generate_board(backlog=100, lanes=2, depth=3, nesting=0, shared=0, bugs=0.0, wip_limit=3, seed=0):
+    """Return a board with:
+
+    backlog:   number of cards in the backlog
+    lanes:     number of lanes
+    depth:     number of columns in each lane (and sub-lane)
+    nesting:   levels of `SublaneColumn` in each lane. With nesting, the
+               backlog holds epics, each holding epics for the next level
+               down, and the innermost epics split into stories.
+    shared:    number of pairs of columns in each lane grouped into a
+               `SharedWIPColumn`
+    bugs:      fraction of cards (without nesting) that are `Bug`s; if not
+               zero, the last lane only takes bugs
+    wip_limit: WIP limit of each column
+
+    `seed` makes the board's card mix reproducible.
+    """
+
+    rng = random.Random(seed)
+
+    def columns(level):
+        card_type = kb.Story if nesting and level == nesting else (kb.Epic if nesting else None)
+        result = [
+            kb.Column("Column %d.%d" % (level, i,), touch=touch, wip_limit=wip_limit, card_type=card_type)
+            for i in range(depth)
+        ]
+
+        for g in range(min(shared, len(result) // 2)):
+            grouped = result[g:g + 2]
+            result[g:g + 2] = [
+                kb.SharedWIPColumn("Shared %d.%d" % (level, g,), columns=grouped, wip_limit=wip_limit + 1)
+            ]
+
+        if level < nesting:
+            result.insert(len(result) // 2, kb.SublaneColumn(
+                "Sublane %d" % (level + 1),
+                lane_template=kb.Lane("Level %d" % (level + 1), columns(level + 1)),
+                wip_limit=wip_limit,
+                card_type=kb.Epic,
+            ))
+
+        return result
+
+    def epic(name, level):
+        if level == nesting:
+            return kb.Epic(name, splits={"Sublane %d" % level: split})
+
+        card = kb.Epic(name)
+        card.cards.extend([epic("%s.%d" % (name, i,), level + 1) for i in range(rng.randint(1, 3))])
+        return card
+
+    if nesting:
+        cards = [epic("Epic %d" % i, 1) for i in range(backlog)]
+    else:
+        cards = [(Bug if rng.random() < bugs else kb.Card)("Card %d" % i) for i in range(backlog)]
+
+    board_lanes = [kb.Lane("Lane %d" % l, columns(0)) for l in range(lanes)]
+
+    if bugs and not nesting:
+        for column in board_lanes[-1].columns:
+            for c in getattr(column, 'columns', [column]):
+                c.card_type = Bug
+
+    return kb.Board("Benchmark", board_lanes, kb.Backlog(cards=cards))
+
+
+SCENARIOS = {
+    'small': dict(backlog=50, lanes=2, depth=3),
+    'large-backlog': dict(backlog=5000, lanes=2, depth=3),
+    'many-lanes': dict(backlog=1000, lanes=20, depth=3),
+    'deep': dict(backlog=500, lanes=2, depth=20),
+    'nested': dict(backlog=50, lanes=2, depth=3, nesting=2),
+    'shared': dict(backlog=1000, lanes=2, depth=6, shared=3),
+    'mixed-types': dict(backlog=1000, lanes=3, depth=3, bugs=0.3),
+}
+
+
+def measure(board, trials=20, repeat=3, seed=0, engine='tick'):
+    """Return a dict of measurements for `board`, taking the best of
+    `repeat` runs for timings:
+
+    days_per_second:   simulated days per second in `run_simulation()`
+    trials_per_second: trials per second in `run_monte_carlo_simulation()`
+    clone_time:        seconds to `clone()` the board
+    instantiate_time:  seconds to build the board from a `BoardTemplate`
+    peak_memory:       peak bytes allocated during one simulation, or None
+                       if `tracemalloc` is not available
+    days:              days taken by the first simulation
+    """
+
+    state = random.getstate()
+    try:
+        random.seed(seed)
+
+        days, elapsed = 0, []
+        for _ in range(repeat):
+            trial_board = board.clone()
+            start = time.time()
+            days, _ = trial_board.run_simulation(engine=engine)
+            elapsed.append(time.time() - start)
+
+        start = time.time()
+        board.run_monte_carlo_simulation(trials=trials, seed=seed, summary=True, engine=engine)
+        mc_elapsed = time.time() - start
+
+        template = board.compile()
+        clone_time = _best(board.clone, repeat)
+        instantiate_time = _best(template.instantiate, repeat)
+
+        peak = None
+        if tracemalloc is not None:
+            trial_board = board.clone()
+            tracemalloc.start()
+            try:
+                trial_board.run_simulation(engine=engine)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+    finally:
+        random.setstate(state)
+
+    return {
+        'days_per_second': days / max(min(elapsed), 1e-9),
+        'trials_per_second': trials / max(mc_elapsed, 1e-9),
+        'clone_time': clone_time,
+        'instantiate_time': instantiate_time,
+        'peak_memory': peak,
+        'days': days,
+    }
+
+
+def _best(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_suite(scenarios=None, trials=20, repeat=3, engine='tick', out=None):
+    """Measure each of `scenarios` (a dict of name to `generate_board()`
+    arguments, by default `SCENARIOS`) and return a dict of results,
+    with some information about the platform under 'meta'.
+
+    Progress is written to `out`, if given.
+    """
+
+    if scenarios is None:
+        scenarios = SCENARIOS
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'engine': engine,
+            'trials': trials,
+            'boards': dict((name, scenarios[name]) for name in scenarios),
+        },
+        'scenarios': {},
+    }
+
+    for name in sorted(scenarios):
+        if out is not None:
+            out.write("%s... " % name)
+            out.flush()
+
+        board = generate_board(**scenarios[name])
+        results['scenarios'][name] = measure(board, trials=trials, repeat=repeat, engine=engine)
+
+        if out is not None:
+            out.write("done\n")
+
+    return results
+
+
+# Metrics where a bigger number is better
+HIGHER_IS_BETTER = ('days_per_second', 'trials_per_second',)
+
+
+def compare(results, baseline, threshold=0.1):
+    """Compare two sets of results from `run_suite()` and return a list of
+    `(scenario, metric, baseline value, new value, change, regressed)`
+    tuples, where `change` is the change relative to the baseline value
+    (positive is better) and `regressed` is True if it is worse than
+    `-threshold`.
+
+    Raises `ValueError` if the results were run with a different engine or
+    number of trials, or on a different board for any scenario in both.
+    """
+
+    meta, old_meta = results['meta'], baseline.get('meta', {})
+    for key in ('engine', 'trials',):
+        if meta.get(key) != old_meta.get(key):
+            raise ValueError("Can't compare results with %s %r to a baseline with %s %r" % (
+                key, meta.get(key), key, old_meta.get(key),
+            ))
+
+    rows = []
+    for name, metrics in sorted(results['scenarios'].items()):
+        old_metrics = baseline['scenarios'].get(name)
+        if old_metrics is None:
+            continue
+
+        # Scenario arguments as they would be saved as JSON
+        board = json.loads(json.dumps(meta.get('boards', {}).get(name)))
+        if board != old_meta.get('boards', {}).get(name):
+            raise ValueError("Can't compare results for %s, as the baseline used a different board" % name)
+
+        for metric, value in sorted(metrics.items()):
+            old = old_metrics.get(metric)
+            if metric == 'days' or not old or not value:
+                continue
+
+            change = (value - old) / float(old) if metric in HIGHER_IS_BETTER else (old - value) / float(old)
+            rows.append((name, metric, old, value, change, change < -threshold,))
+
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Kanban simulator")
+    parser.add_argument('--trials', type=int, default=20, help="Monte Carlo trials per scenario")
+    parser.add_argument('--repeat', type=int, default=3, help="repeats of each timing")
+    parser.add_argument('--engine', default='tick', help="simulation engine")
+    parser.add_argument('--scenario', action='append', help="run only this scenario (may be repeated)")
+    parser.add_argument('--save', help="save the results to this JSON file")
+    parser.add_argument('--compare', help="compare the results to this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    scenarios = SCENARIOS
+    if args.scenario:
+        scenarios = dict((name, SCENARIOS[name]) for name in args.scenario)
+
+    results = run_suite(scenarios, trials=args.trials, repeat=args.repeat, engine=args.engine, out=sys.stderr)
+
+    for name, metrics in sorted(results['scenarios'].items()):
+        print("%-15s %10.0f days/s %8.1f trials/s %8.4fs clone %8.4fs instantiate %10s bytes peak" % (
+            name,
+            metrics['days_per_second'],
+            metrics['trials_per_second'],
+            metrics['clone_time'],
+            metrics['instantiate_time'],
+            metrics['peak_memory'],
+        ))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    regressed = False
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        try:
+            rows = compare(results, baseline, args.threshold)
+        except ValueError as e:
+            parser.error(str(e))
+
+        print("")
+        for name, metric, old, new, change, worse in rows:
+            regressed = regressed or worse
+            print("%-15s %-18s %12.4g -> %12.4g %+7.1f%%%s" % (
+                name, metric, old, new, change * 100, "  REGRESSION" if worse else "",
+            ))
+
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
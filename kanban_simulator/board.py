@@ -1,8 +1,27 @@
+import io
 import abc
+import math
+import heapq
+import types
+import pickle
+import hashlib
+import random
+import csv
 import itertools
 import copy
 import collections
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A base for abstract classes in Python 2 and 3 alike. It is defined before
+# importing montecarlo, which imports modules that use it.
+ABC = abc.ABCMeta('ABC', (object,), {'__slots__': ()})
+
+from kanban_simulator import montecarlo
+
 #
 # Interfaces
 #
@@ -13,6 +32,7 @@ class CardSource(object):
     """
 
     __metaclass__ = abc.ABCMeta
+    __slots__ = ()
 
     @abc.abstractmethod
     def next_card(self, card_type=None):
@@ -28,31 +48,70 @@ class CardContainer(object):
     """
 
     __metaclass__ = abc.ABCMeta
+    __slots__ = ()
 
     name = ""
     cards = []
+    board = None  # the Board the container is on, set when wired
 
     @abc.abstractproperty
     def is_empty(self):
         """Return True if the container is empty
         """
 
+class BoardListener(object):
+    """Is told what happens on a board. Add listeners to `Board.listeners`.
+    """
+
+    __slots__ = ()
+
+    def start_trial(self, trial, seed):
+        """Called before each trial of a Monte Carlo simulation the listener
+        is used in.
+        """
+
+    def card_moved(self, board, card, source, target):
+        """Called when `card` is pulled from location `source` (None for a
+        card that has not been on the board before) to location `target`.
+        """
+
+    def card_split(self, board, epic, stories):
+        """Called when `epic` is split into the list of `stories`.
+        """
+
+    def ticked(self, board, date, days=1):
+        """Called after the board has been ticked for `days` days up to and
+        including `date`.
+        """
+
 class TimeAware(object):
     """Acts when time passes
     """
 
     __metaclass__ = abc.ABCMeta
+    __slots__ = ()
 
     @abc.abstractmethod
-    def tick(self, date):
-        """Record that one day has passed
+    def tick(self, date, days=1):
+        """Record that one day has passed, or `days` days ending with
+        (and including) `date`
         """
 
+    def next_event(self):
+        """Return the number of days from today until the next day on which
+        a card held here will have finished its touch time, or None if
+        there is no such card.
+
+        This is called after the day's pull, but before the day's tick.
+        """
+        return None
+
 class LocationAware(object):
     """Acts when location (backlog, column, donelog) changes
     """
 
     __metaclass__ = abc.ABCMeta
+    __slots__ = ()
 
     @abc.abstractmethod
     def pull_to(self, location):
@@ -65,6 +124,7 @@ class PullCapable(object):
     """
 
     __metaclass__ = abc.ABCMeta
+    __slots__ = ()
 
     @abc.abstractmethod
     def pull(self, check=None):
@@ -73,32 +133,170 @@ class PullCapable(object):
         If check is given, it should be a callable that takes as a parameter
         the `PullCapable` instance and returns True/False to decide if pulling
         should be allowed.
+
+        Returns the number of cards that were pulled.
         """
 
 #
 # Helpers
 #
 
+def earliest(values):
+    """Return the smallest value that is not None, or None
+    """
+    values = [v for v in values if v is not None]
+    return min(values) if values else None
+
+
+class CardQueue(object):
+    """A FIFO queue of cards that can also find and remove the first card
+    of a given type in constant time. It otherwise behaves like a list of
+    cards.
+
+    Cards are numbered in the order they are added, and kept in a queue
+    per concrete card type as well as in a queue of all cards. Cards removed
+    from the middle of a queue are skipped when they reach the front.
+    """
+
+    def __init__(self, cards=()):
+        self._added = 0  # number of cards ever added
+        self._cards = {}  # sequence number -> card
+        self._order = collections.deque()  # sequence numbers of all cards
+        self._by_type = {}  # card class -> deque of sequence numbers
+        self._matching = {}  # requested card_type -> list of card classes
+
+        self.extend(cards)
+
+    def append(self, card):
+        seq = self._added
+        self._added += 1
+
+        self._cards[seq] = card
+        self._order.append(seq)
+
+        card_class = type(card)
+        if card_class not in self._by_type:
+            self._by_type[card_class] = collections.deque()
+            self._matching.clear()
+        self._by_type[card_class].append(seq)
+
+    def extend(self, cards):
+        for card in cards:
+            self.append(card)
+
+    def popleft(self, card_type=None):
+        """Remove and return the first card of the given card_type (or any
+        card, if not set), or None if there is no such card.
+        """
+
+        seq = self._first(card_type)
+        if seq is None:
+            return None
+
+        card = self._cards.pop(seq)
+        self._clean(self._by_type[type(card)])
+        self._clean(self._order)
+        self._compact()
+
+        return card
+
+    def peek(self, card_type=None):
+        """Return the first card of the given card_type (or any card, if
+        not set), without removing it, or None if there is no such card.
+        """
+
+        seq = self._first(card_type)
+        return None if seq is None else self._cards[seq]
+
+    def remove(self, card):
+        for seq, c in self._cards.items():
+            if c is card:
+                del self._cards[seq]
+                self._clean(self._by_type[type(card)])
+                self._clean(self._order)
+                self._compact()
+                return
+
+        raise ValueError("%r is not in the queue" % card)
+
+    def clear(self):
+        self._cards.clear()
+        self._order.clear()
+        self._by_type.clear()
+        self._matching.clear()
+
+    def _first(self, card_type):
+        if card_type is None:
+            return self._order[0] if self._order else None
+
+        first = None
+        for card_class in self._classes(card_type):
+            queue = self._by_type[card_class]
+            if queue and (first is None or queue[0] < first):
+                first = queue[0]
+        return first
+
+    def _classes(self, card_type):
+        classes = self._matching.get(card_type)
+        if classes is None:
+            classes = self._matching[card_type] = [c for c in self._by_type if issubclass(c, card_type)]
+        return classes
+
+    def _clean(self, queue):
+        while queue and queue[0] not in self._cards:
+            queue.popleft()
+
+    def _compact(self):
+        # Drop cards removed from the middle of the queues once they make up
+        # most of the entries
+        if len(self._order) > 2 * len(self._cards) + 16:
+            self._order = collections.deque(s for s in self._order if s in self._cards)
+            for card_class, queue in self._by_type.items():
+                self._by_type[card_class] = collections.deque(s for s in queue if s in self._cards)
+
+    def __len__(self):
+        return len(self._cards)
+
+    def __iter__(self):
+        cards = self._cards
+        return (cards[seq] for seq in self._order if seq in cards)
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __repr__(self):
+        return repr(list(self))
+
 
 class QueueCardSource(CardContainer, CardSource):
     """Card source for things that act like queues
+
+    If the queue is the backlog of a sub-lane, `owner` is set to that lane,
+    which is told when cards are taken from the queue.
     """
 
+    owner = None
+
     def __init__(self, name, cards=None):
         self.name = name
         self.cards = [] if cards is None else cards
 
-    def next_card(self, card_type=None):
-        if len(self.cards) > 0:
-            if card_type is None:
-                return self.cards.pop(0)
-            else:
-                card = next((c for c in self.cards if isinstance(c, card_type)), None)
-                if card is not None:
-                    self.cards.remove(card)
-                    return card
+    def cards():
 
-        return None
+        def fget(self):
+            return self._cards
+
+        def fset(self, value):
+            self._cards = value if isinstance(value, CardQueue) else CardQueue(value)
+
+        return locals()
+    cards = property(**cards())
+
+    def next_card(self, card_type=None):
+        card = self.cards.popleft(card_type)
+        if card is not None and self.owner is not None:
+            self.owner._changed(0, -1)
+        return card
 
     @property
     def is_empty(self):
@@ -138,22 +336,54 @@ class AggregateCardSource(CardSource):
 
 class Board(TimeAware, PullCapable, CardContainer):
     """A Kanban board, with one or more lanes, a backlog and a donelog.
+    `retention` is passed to the donelog (see `Donelog`).
+
+    `listeners` is a list of `BoardListener` instances to be told about
+    moves and days passing. Listeners are not copied when the board is
+    cloned or compiled.
     """
 
-    def __init__(self, name, lanes, backlog):
+    def __init__(self, name, lanes, backlog, retention='cards'):
         self.name = name
         self.lanes = lanes
         self.backlog = backlog
-        self.donelog = Donelog()
+        self.donelog = Donelog(retention=retention)
+        self.listeners = []
+        self.day = 0  # the day being simulated
 
         self.wire()
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['listeners'] = []
+        return state
+
     def clone(self):
         return copy.deepcopy(self)
 
+    def compile(self):
+        """Return a `BoardTemplate` of the board in its current state, which
+        can build new copies of it much faster than `clone()`.
+        """
+        return BoardTemplate(self)
+
+    def instrument(self, callback=None):
+        """Start counting and timing what the board does, and return the
+        `kanban_simulator.instrument.Stats` that will hold the results.
+        See that module for details.
+        """
+        from kanban_simulator import instrument
+        return instrument.enable(self, callback)
+
+    def uninstrument(self):
+        """Stop counting and timing what the board does
+        """
+        from kanban_simulator import instrument
+        instrument.disable(self)
+
     # Simulation
 
-    def run_simulation(self, max_days=100000):
+    def run_simulation(self, max_days=100000, engine='tick'):
         """Run a simulation once and return a (day, board) tuple.
 
         The history of each card can be obtained from the `board.donelog.cards`
@@ -161,30 +391,123 @@ class Board(TimeAware, PullCapable, CardContainer):
 
         `max_days` is a guard to stop infinite loops.
 
+        `engine` is either 'tick', to simulate every day in turn, or 'event',
+        to skip over days on which nothing can change (see `iter_events()`).
+        Both give the same results.
+
         This will mutate the board's state. Use `clone` as required to keep
         the initial state.
         """
 
+        if engine == 'tick':
+            days = iter(self)
+        elif engine == 'event':
+            days = self.iter_events()
+        else:
+            raise ValueError("Unknown engine %r" % engine)
+
         day = 0
-        for day, board in self:
+        for day, board in days:
             if day > max_days:
                 raise OverflowError
         return day, self
 
-    def run_monte_carlo_simulation(self, trials=100, max_days=100000):
-        """Run the simulation `trials` times, each up to `max_days` days.
-
-        Returns a list of `(day, board)` tuples, soted by day.
+    def run_monte_carlo_simulation(self, trials=100, max_days=100000, seed=None, processes=1, summary=False, engine='tick', listeners=(), cache=None, coordinator=None):
+        """Run the simulation `trials` times, each up to `max_days` days,
+        using the given `engine` (see `run_simulation()`).
+
+        Each trial seeds the random number generator with its own seed,
+        derived from the master `seed`, so results are reproducible for a
+        given `seed` however many processes are used. If `seed` is None, it
+        is drawn from the global random number generator.
+
+        `processes` is the number of worker processes to spread the trials
+        over (None means one per CPU). The default of 1 runs all trials in
+        this process. Boards using lambdas for `touch` or `splits` require
+        `cloudpickle` to be installed to run in parallel; distributions from
+        `kanban_simulator.distributions` don't.
+
+        Returns a list of `(day, board)` tuples, soted by day. If `summary`
+        is True, returns a list of `TrialSummary` records instead, also sorted
+        by day, so that memory use does not grow with the size of each board.
+        Use `replay_trial()` to rebuild the board for any one of them.
+
+        `listeners` are `BoardListener` instances to add to the board of each
+        trial. They can only be used when running trials in this process.
+
+        `cache` is a `kanban_simulator.cache.ResultCache`, or the path of a
+        directory to use as one, in which to look up and save results. It
+        requires a `seed` and `summary=True`, and can't be used with
+        `listeners`. Only trials not already in the cache are run.
+
+        `coordinator` is a `kanban_simulator.cluster.Coordinator` to run the
+        trials on its workers instead of here. It requires `summary=True`,
+        and can't be used with `listeners`.
         """
 
-        finishes = []
+        if (cache is not None or coordinator is not None) and (not summary or listeners):
+            raise ValueError("A cache or coordinator requires summary=True, and can't be used with listeners")
+
+        if cache is not None:
+            from kanban_simulator.cache import ResultCache
+            if not isinstance(cache, ResultCache):
+                cache = ResultCache(cache)
+            if seed is None:
+                raise ValueError("A cache requires a seed")
 
-        for attempt in range(trials):
-            day, board = self.clone().run_simulation(max_days=max_days)
-            finishes.append((day, board,))
+            finishes = cache.run_trials(self, seed, trials, max_days=max_days, processes=processes, engine=engine,
+                                        coordinator=coordinator)
+            return sorted(finishes, key=lambda x: x[0])
+
+        seeds = montecarlo.trial_seeds(seed, trials)
+
+        if coordinator is not None:
+            finishes = coordinator.run_trials(self, seeds, max_days=max_days, engine=engine)
+            return sorted(finishes, key=lambda x: x[0])
+
+        finishes = montecarlo.run_trials(self, seeds, max_days=max_days, processes=processes, summary=summary,
+                                         engine=engine, listeners=listeners)
 
         return sorted(finishes, key=lambda x: x[0])
 
+    def iter_monte_carlo_simulation(self, quantiles=(0.5, 0.85, 0.95,), tolerance=None, confidence=0.95,
+                                    min_trials=100, max_trials=None, seed=None, max_days=100000, processes=1, engine='tick'):
+        """Run Monte Carlo trials one after the other, yielding an `Estimate`
+        of the finish day after each: the number of trials, the mean, and
+        the given `quantiles` with their `confidence` intervals.
+
+        If `tolerance` is given, stops once at least `min_trials` have run
+        and each interval lies within `tolerance` days of its quantile (the
+        last estimate then has `converged` set). Also stops after
+        `max_trials` trials, if given. Otherwise, the caller must stop.
+
+        Trials are seeded as for `run_monte_carlo_simulation()`. Memory use
+        stays the same however many trials are run.
+        """
+
+        return montecarlo.iter_estimates(
+            self, quantiles=quantiles, tolerance=tolerance, confidence=confidence,
+            min_trials=min_trials, max_trials=max_trials, seed=seed, max_days=max_days,
+            processes=processes, engine=engine
+        )
+
+    def replay_trial(self, trial, max_days=100000, engine='tick'):
+        """Re-run a single Monte Carlo trial and return a (day, board) tuple.
+
+        `trial` is either a `TrialSummary` as returned by
+        `run_monte_carlo_simulation(summary=True)`, or a trial seed.
+
+        This does not change the state of this board.
+        """
+
+        seed = getattr(trial, 'seed', trial)
+
+        state = random.getstate()
+        try:
+            return montecarlo.run_trial(self, seed, max_days=max_days, engine=engine)
+        finally:
+            random.setstate(state)
+
     def __iter__(self):
         """Loop through the simulation, yielding a (day, board,) tuple each
         day until the board is empty (everything is in the Done log).
@@ -193,34 +516,116 @@ class Board(TimeAware, PullCapable, CardContainer):
 
         while not self.is_empty:
             day += 1
+            self.day = day
 
             self.pull()
             self.tick(day)
 
             yield (day, self,)
 
+    def iter_events(self):
+        """Like iterating over the board, but only yield a (day, board,)
+        tuple on days when a card could have moved.
+
+        Cards only become free to move when another card moves or when they
+        finish their touch time, so if nothing moved today, we can skip
+        straight to the next day on which a card finishes its touch time.
+        Cards are still ticked for the days in between.
+        """
+        day = 0
+        wait = 1
+
+        while not self.is_empty:
+            if wait > 1:
+                self.tick(day + wait - 1, days=wait - 1)
+            day += wait
+            self.day = day
+
+            moved = self.pull()
+            wait = 1 if moved else self.next_event()
+
+            # Nothing will ever move again; let `max_days` catch it
+            if wait is None:
+                wait = 1
+
+            self.tick(day)
+
+            yield (day, self,)
+
     def wire(self, force=False):
         """Wire up lanes with the backlog unless one is already set,
         and wire an aggregate card source of all the lanes to the
         master donelog.
         """
+        self.donelog.board = self
+
         for lane in self.lanes:
 
             if lane.backlog is None or force:
                 lane.backlog = self.backlog
 
+            lane.parent = self
+            lane.board = self
             lane.wire(force)
 
         self.donelog.card_source = AggregateCardSource([l.donelog for l in self.lanes])
 
-    def tick(self, date):
+        # Keep count of the cards in the lanes, so that we don't need to
+        # look in every column to tell if the board is empty
+        self._load = sum(l._load for l in self.lanes)
+        self._backlogs = [self.backlog] + [l.backlog for l in self.lanes if l.backlog is not self.backlog]
+
+        # Generated backlogs need to know the day
+        for backlog in self._backlogs:
+            if isinstance(backlog, GeneratedBacklog):
+                backlog.board = self
+
+    def _changed(self, wip, load):
+        self._load += load
+
+    def _moved(self, card, source, target):
+        for listener in self.listeners:
+            listener.card_moved(self, card, source, target)
+
+    def _split(self, epic, stories):
+        for listener in self.listeners:
+            listener.card_split(self, epic, stories)
+
+    def tick(self, date, days=1):
         for lane in self.lanes:
-            lane.tick(date)
+            lane.tick(date, days)
+
+        for listener in self.listeners:
+            listener.ticked(self, date, days)
+
+    def next_event(self):
+        return earliest(itertools.chain(
+            (l.next_event() for l in self.lanes),
+            (b.next_event() for b in self._backlogs if isinstance(b, GeneratedBacklog)),
+        ))
 
     def pull(self, check=None):
-        self.donelog.pull(check)
+        pulled = self.donelog.pull(check)
+
+        if check is not None:
+            for lane in self.lanes:
+                pulled += lane.pull(check)
+            return pulled
+
+        # Skip lanes that moved nothing last time they were pulled, until
+        # one of their cards finishes its touch time or their backlog grows
         for lane in self.lanes:
-            lane.pull(check)
+            if lane._idle_backlog is not None and lane._is_idle():
+                continue
+
+            moved = lane.pull()
+            if moved:
+                lane._idle_backlog = None
+                pulled += moved
+            else:
+                lane._idle()
+
+        return pulled
 
     @property
     def cards(self):
@@ -228,7 +633,21 @@ class Board(TimeAware, PullCapable, CardContainer):
 
     @property
     def is_empty(self):
-        return self.backlog.is_empty and all((l.is_empty for l in self.lanes))
+        return self._load == 0 and all((b.is_empty for b in self._backlogs))
+
+    # Export
+
+    def history_columns(self, numpy=False):
+        """Return the history of every card in the donelog as columns. See
+        `Donelog.history_columns()`.
+        """
+        return self.donelog.history_columns(numpy)
+
+    def write_history_csv(self, fp):
+        """Write the history of every card in the donelog as CSV. See
+        `Donelog.write_history_csv()`.
+        """
+        self.donelog.write_history_csv(fp)
 
     def to_html(self):
         return """
@@ -254,6 +673,120 @@ class Board(TimeAware, PullCapable, CardContainer):
             'done': self.donelog.to_html(),
         }
 
+class BoardTemplate(object):
+    """A frozen snapshot of a board, used to build a fresh copy of it for
+    each trial of a simulation. Use `Board.compile()` to create one.
+
+    The board is pickled once, keeping functions and classes (such as
+    `touch` and `splits` callables and card types) aside so that, as with
+    `Board.clone()`, they are shared by all copies. Unpickling a copy is
+    much faster than deep copying the board.
+
+    A template is never changed once created, so it can be shared between
+    threads, or sent to other processes (which requires `cloudpickle` if the
+    board uses lambdas). If the board can't be pickled, the template falls
+    back to deep copying a snapshot of it.
+    """
+
+    def __init__(self, board):
+        self.name = board.name
+
+        data = io.BytesIO()
+        externals = []
+
+        try:
+            _TemplatePickler(data, externals).dump(board)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            self._data, self._externals, self._snapshot = None, (), copy.deepcopy(board)
+        else:
+            self._data, self._externals, self._snapshot = data.getvalue(), tuple(externals), None
+
+    def instantiate(self):
+        """Return a new board in the state the template was compiled from
+        """
+        if self._data is None:
+            return copy.deepcopy(self._snapshot)
+
+        return _TemplateUnpickler(io.BytesIO(self._data), self._externals).load()
+
+    # A template can stand in for the board wherever it is only cloned
+    clone = instantiate
+
+    def compile(self):
+        return self
+
+    def fingerprint(self):
+        """Return a hex digest that identifies the board's structure, cards
+        and `touch` and `splits` callables, or None if the board can't be
+        pickled.
+
+        Callables are identified by name and, for plain functions and
+        lambdas, by their code, default arguments and closure values, so
+        changing the parameters of a lambda changes the fingerprint.
+        Changes to global variables a callable uses are not noticed.
+        """
+        if self._data is None:
+            return None
+
+        digest = hashlib.sha1(self._data)
+        for obj in self._externals:
+            digest.update(_external_fingerprint(obj).encode('utf-8'))
+        return digest.hexdigest()
+
+    def __repr__(self):
+        return "<BoardTemplate %s>" % self.name
+
+def _external_fingerprint(obj):
+    name = "%s.%s" % (getattr(obj, '__module__', None), getattr(obj, '__qualname__', getattr(obj, '__name__', None)),)
+    if not isinstance(obj, types.FunctionType):
+        return name
+
+    closure = [_value_fingerprint(cell.cell_contents) for cell in obj.__closure__ or ()]
+    return repr((name, _code_fingerprint(obj.__code__), _value_fingerprint(obj.__defaults__), closure,))
+
+def _code_fingerprint(code):
+    return repr((code.co_code, code.co_names, [
+        _code_fingerprint(c) if isinstance(c, types.CodeType) else repr(c) for c in code.co_consts
+    ],))
+
+def _value_fingerprint(value):
+    if isinstance(value, (types.FunctionType, type,)):
+        return _external_fingerprint(value)
+    if isinstance(value, (tuple, list,)):
+        return repr([_value_fingerprint(v) for v in value])
+    return repr(value)
+
+class _TemplatePickler(pickle.Pickler):
+    """Pickles a board, replacing functions and classes with references
+    to a list of `externals`.
+    """
+
+    external_types = (types.FunctionType, types.BuiltinFunctionType, type,)
+
+    def __init__(self, file, externals):
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.externals = externals
+        self.indexes = {}
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, self.external_types):
+            return None
+
+        index = self.indexes.get(id(obj))
+        if index is None:
+            index = self.indexes[id(obj)] = len(self.externals)
+            self.externals.append(obj)
+        return index
+
+class _TemplateUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, externals):
+        pickle.Unpickler.__init__(self, file)
+        self.externals = externals
+
+    def persistent_load(self, index):
+        return self.externals[index]
+
 class Backlog(ChainingQueueCardSource):
     """A FIFO backlog
     """
@@ -268,23 +801,225 @@ class Backlog(ChainingQueueCardSource):
         return '\n'.join((c.to_html() for c in self.cards))
 
 
+class GeneratedBacklog(Backlog):
+    """A backlog that makes its cards as they are needed, rather than
+    holding them all from the start, so that memory use depends on the
+    number of cards in flight rather than on total demand.
+
+    factory:  a callable taking the number of the card (from 0) and the
+              day it arrives, and returning a new card
+    arrivals: None to make a card whenever one is asked for and none are
+              waiting, or the number of cards that arrive each day, or a
+              callable taking the day and returning such. Cards that have
+              arrived but not been pulled wait in `cards`.
+    limit:    the total number of cards to make, or None for no limit. A
+              board with an unlimited backlog is never empty, so iterate over
+              it rather than using `run_simulation()`, which would raise
+              `OverflowError` at `max_days`.
+
+    Like `touch`, `factory` and `arrivals` should be module-level functions
+    or lambdas rather than generators, so that the board can be cloned.
+    Arrivals are counted using the day of the board the backlog is on.
+    """
+
+    def __init__(self, name="Backlog", factory=None, arrivals=None, limit=None, card_source=None):
+        super(GeneratedBacklog, self).__init__(name, None, card_source)
+
+        self.factory = factory
+        self.arrivals = arrivals
+        self.limit = limit
+
+        self.generated = 0  # number of cards made so far
+        self._day = 0  # last day for which arrivals have been made
+
+    def __repr__(self):
+        return "<GeneratedBacklog %s>" % self.name
+
+    @property
+    def exhausted(self):
+        """True if no more cards will be made
+        """
+        return self.limit is not None and self.generated >= self.limit
+
+    @property
+    def is_empty(self):
+        return len(self.cards) == 0 and self.exhausted
+
+    def next_card(self, card_type=None):
+        day = self.board.day if self.board is not None else 0
+
+        if self.arrivals is not None:
+            self._arrive(day)
+
+        card = QueueCardSource.next_card(self, card_type)
+
+        if card is None and self.arrivals is None and not self.exhausted:
+            card = self._make(day)
+            if card_type is not None and not isinstance(card, card_type):
+                self.cards.append(card)
+                card = None
+
+        if card is None and self.card_source is not None:
+            card = self.card_source.next_card(card_type)
+        return card
+
+    def next_event(self):
+        """Cards may arrive tomorrow for as long as more are to be made
+        """
+        return 1 if self.arrivals is not None and not self.exhausted else None
+
+    def _arrive(self, day):
+        # Once exhausted, don't draw arrivals that can't be used: when they
+        # are drawn depends on when cards are asked for, which differs
+        # between engines
+        while self._day < day and not self.exhausted:
+            self._day += 1
+            count = self.arrivals(self._day) if callable(self.arrivals) else self.arrivals
+            for _ in range(count):
+                if self.exhausted:
+                    return
+                self.cards.append(self._make(self._day))
+
+    def _make(self, day):
+        card = self.factory(self.generated, day)
+        self.generated += 1
+        return card
+
+
+class CardSummary(collections.namedtuple('CardSummary', ['name', 'type', 'parent_epic', 'start', 'finish', 'age', 'touch', 'columns'])):
+    """A compact record of a finished card, kept by a donelog with
+    `retention='summary'`:
+
+    name:        name of the card
+    type:        name of the card's class
+    parent_epic: name of the card's epic, or None
+    start:       first day the card was active, or None
+    finish:      last day the card was active, or None
+    age:         number of days the card was active
+    touch:       total touch time
+    columns:     tuple of `(location, age, touch)` for each location the
+                 card was active in, named as by `location_path()`
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_card(cls, card, paths=None):
+        """Summarise `card`. `paths` is an optional dict of location ->
+        path, used to share the path strings between summaries.
+        """
+        if paths is None:
+            paths = {}
+
+        columns = collections.OrderedDict()
+        start = finish = None
+
+        for location, enter, exit, touch in card.intervals:
+            if enter is None:
+                continue
+            if start is None:
+                start = enter
+            finish = exit
+
+            path = paths.get(location)
+            if path is None:
+                path = paths[location] = location_path(location)
+
+            age, _ = columns.get(path, (0, 0,))
+            columns[path] = (age + exit - enter + 1, touch,)
+
+        parent_epic = getattr(card, 'parent_epic', None)
+        return cls(
+            name=card.name,
+            type=type(card).__name__,
+            parent_epic=parent_epic.name if parent_epic is not None else None,
+            start=start,
+            finish=finish,
+            age=card.age,
+            touch=card.touch,
+            columns=tuple((path, age, touch,) for path, (age, touch) in columns.items()),
+        )
+
+
+class DoneStats(object):
+    """Aggregate statistics of the cards in a donelog:
+
+    count: number of cards
+    age:   total age of the cards
+    touch: total touch time of the cards
+    ages:  a `DaySketch` of the age of each card, from which quantiles of
+           the cycle time can be read
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.age = 0
+        self.touch = 0
+        self.ages = montecarlo.DaySketch()
+
+    def add(self, age, touch):
+        self.count += 1
+        self.age += age
+        self.touch += touch
+        self.ages.add(age)
+
+    @property
+    def mean_age(self):
+        return self.ages.mean
+
+
 class Donelog(ChainingQueueCardSource, PullCapable):
     """The opposite of a backlog - the cards that are done.
 
     The card_source usually doesn't need to be set, as it is set
     when the Board is wired.
+
+    `retention` says what is kept of the cards pulled into the donelog:
+
+    'cards':   the cards themselves, in `cards` (the default)
+    'summary': a `CardSummary` of each card, in `summaries`
+    'stats':   only the `DoneStats` in `stats`
+
+    The last two let long simulations run in bounded memory. They only make
+    sense for the board's donelog, as the cards in a lane's donelog are
+    passed on to the board's.
     """
 
-    def __init__(self, name="Done", cards=None, card_source=None):
+    lane = None  # the lane, if this is a lane's donelog
+
+    retention_modes = ('cards', 'summary', 'stats',)
+
+    def __init__(self, name="Done", cards=None, card_source=None, retention='cards'):
         ChainingQueueCardSource.__init__(self, name, cards, card_source)
 
+        if retention not in self.retention_modes:
+            raise ValueError("Unknown retention %r" % retention)
+
         self.name = name
         self.cards = [] if cards is None else cards
+        self.retention = retention
+        self.summaries = []
+        self._stats = DoneStats()
+        self._paths = {}  # location -> path, for summaries
+
+    @property
+    def stats(self):
+        """A `DoneStats` of the cards pulled into the donelog
+        """
+        if self.retention != 'cards':
+            return self._stats
+
+        stats = DoneStats()
+        for card in self.cards:
+            stats.add(card.age, card.touch)
+        return stats
 
     def __repr__(self):
         return "<Donelog %s>" % self.name
 
     def pull(self, check=None):
+        pulled = 0
+
         # Greedily pull cards
         while True:
             if check is not None and not check(self):
@@ -295,17 +1030,150 @@ class Donelog(ChainingQueueCardSource, PullCapable):
             if card is None:
                 break
 
-            self.cards.append(card)
-            card.pull_to(self)
+            if self.retention == 'cards':
+                self.cards.append(card)
+                card.pull_to(self)
+            else:
+                card.pull_to(self)
+                self._stats.add(card.age, card.touch)
+                if self.retention == 'summary':
+                    self.summaries.append(CardSummary.from_card(card, self._paths))
+
+            pulled += 1
+
+        return pulled
+
+    # Export
+
+    history_fields = ('card', 'type', 'parent_epic', 'column', 'lane', 'enter', 'exit', 'touch', 'age',)
+
+    def iter_history(self):
+        """Yield a tuple of `history_fields` for each location each card
+        (and each story of each epic) in the donelog has been in:
+
+        card:        name of the card
+        type:        name of the card's class
+        parent_epic: name of the card's epic, or None
+        column:      name of the location, e.g. a column or donelog
+        lane:        name of the lane the location is in, or None
+        enter, exit: first and last days the card was active there, or None
+        touch:       touch time recorded there
+        age:         number of days the card was active there
+
+        Only available with `retention='cards'`.
+        """
+
+        if self.retention != 'cards':
+            raise ValueError("Card history is only kept with retention='cards'")
+
+        for card in self.cards:
+            for row in _card_history(card):
+                yield row
+
+    def history_columns(self, numpy=False):
+        """Return the rows of `iter_history()` as a dict of field name to a
+        list of values, which can be passed to `pandas.DataFrame`.
+
+        If `numpy` is True, return NumPy arrays instead, with None
+        enter and exit days replaced by -1.
+        """
+
+        columns = tuple([] for _ in self.history_fields)
+        appends = [c.append for c in columns]
+
+        for row in self.iter_history():
+            for append, value in zip(appends, row):
+                append(value)
+
+        if numpy:
+            columns = _history_arrays(self.history_fields, columns)
+
+        return dict(zip(self.history_fields, columns))
+
+    def write_history_csv(self, fp):
+        """Write the rows of `iter_history()` to the file `fp` as CSV, with
+        a header row, one card at a time.
+        """
+
+        writer = csv.writer(fp)
+        writer.writerow(self.history_fields)
+        writer.writerows(self.iter_history())
 
     def to_html(self):
         return '\n'.join((c.to_html() for c in self.cards))
 
+def base_class(obj):
+    """Return the class of `obj`, or for a container of an instrumented
+    board (see `kanban_simulator.instrument`), the class it was instrumented
+    from
+    """
+
+    cls = type(obj)
+    return cls.__dict__.get('_uninstrumented', cls)
+
+def location_path(location):
+    """Return the name of `location` prefixed with the names of the lanes
+    (and columns, for sub-lanes) it is in, e.g. "Team 1/Discovery".
+    """
+
+    names = [location.name]
+
+    parent = getattr(location, 'lane', None)
+    while parent is not None and not isinstance(parent, Board):
+        names.append(parent.name)
+        parent = getattr(parent, 'parent', None) or getattr(parent, 'lane', None)
+
+    return "/".join(reversed(names))
+
+def _card_history(card):
+    card_type = type(card).__name__
+    parent_epic = getattr(card, 'parent_epic', None)
+    parent_epic = parent_epic.name if parent_epic is not None else None
+
+    for location, enter, exit, touch in card.intervals:
+        lane = getattr(location, 'lane', None)
+        while lane is not None and not isinstance(lane, Lane):
+            lane = lane.lane
+
+        yield (
+            card.name,
+            card_type,
+            parent_epic,
+            getattr(location, 'name', None),
+            lane.name if lane is not None else None,
+            enter,
+            exit,
+            touch,
+            exit - enter + 1 if enter is not None else 0,
+        )
+
+    for story in getattr(card, 'stories', ()):
+        for row in _card_history(story):
+            yield row
+
+def _history_arrays(fields, columns):
+    if numpy is None:
+        raise ImportError("NumPy is required to export history as arrays")
+
+    arrays = []
+    for field, values in zip(fields, columns):
+        if field in ('enter', 'exit'):
+            arrays.append(numpy.array([-1 if v is None else v for v in values], dtype=numpy.int64))
+        elif field in ('touch', 'age'):
+            arrays.append(numpy.array(values))
+        else:
+            arrays.append(numpy.array(values, dtype=object))
+    return arrays
+
 class Lane(TimeAware, CardContainer, PullCapable):
     """A lane containing multiple columns.
 
     The backlog is normally wired in from the parent Board,
     and the donelog will be created automatically if not passed in.
+
+    The lane keeps count of the cards counted against its WIP limit and of
+    all the cards in its columns and sub-lanes, and tells its `parent` (a
+    Board or SublaneColumn) when these change.
     """
 
     def __init__(self, name, columns, backlog=None, wip_limit=None):
@@ -317,12 +1185,19 @@ class Lane(TimeAware, CardContainer, PullCapable):
 
         self.wip_limit = wip_limit
 
+        self.parent = None
+        self._wip = 0  # cards in the columns
+        self._load = 0  # cards in the columns and sub-lanes, and in the backlog if we own it
+        self._idle_backlog = None  # (queue, cards added) of the backlog when a pull last moved nothing
+        self._standalone = False  # only the backlog and touch times can make us pullable
+
     def clone(self, name=None, backlog=None):
         lane = copy.copy(self)
 
         lane.columns = [c.clone() for c in self.columns]
         lane.backlog = backlog if backlog is not None else self.backlog
         lane.donelog = Donelog(name=self.name + " Done")
+        lane.parent = None
 
         if name is not None:
             lane.name = name
@@ -331,41 +1206,127 @@ class Lane(TimeAware, CardContainer, PullCapable):
 
         return lane
 
+    def reset(self):
+        """Remove all cards from the lane's columns and donelog, so that the
+        lane can be used again.
+        """
+        load = self._load
+
+        for column in self.columns:
+            column.reset()
+        self.donelog.cards.clear()
+
+        self._recount()
+        self._idle_backlog = None
+        if self.parent is not None:
+            self.parent._changed(0, self._load - load)
+
     def wire(self, force=False):
         source = self.backlog
 
         for column in self.columns:
             column.lane = self
+            column.board = self.board
             if column.card_source is None or force:
                 column.card_source = source
             source = column
 
         self.donelog.card_source = source
+        self.donelog.board = self.board
+        self.donelog.lane = self
+        self._recount()
+
+        self._idle_backlog = None
+        self._standalone = self._is_standalone()
 
-    def tick(self, date):
+    def _recount(self):
         for column in self.columns:
-            column.tick(date)
+            column._adopt()
+
+        self._wip = sum(len(c.cards) for c in self.columns)
+        self._load = sum(c._load for c in self.columns)
+        if getattr(self.backlog, 'owner', None) is self:
+            self._load += len(self.backlog.cards)
+
+    def _changed(self, wip, load):
+        self._wip += wip
+        self._load += load
+        if self.parent is not None:
+            self.parent._changed(0, load)
+
+    def tick(self, date, days=1):
+        for column in self.columns:
+            column.tick(date, days)
+
+    def next_event(self):
+        return earliest(c.next_event() for c in self.columns)
+
+    def _is_idle(self):
+        """Return True if pulling can't move anything, because nothing has
+        changed since a pull that moved nothing
+        """
+        if self._idle_backlog is None:
+            return False
+
+        cards = self.backlog.cards
+        return self._idle_backlog == (cards, cards._added,)
+
+    def _idle(self):
+        """Record that a pull moved nothing.
+
+        Nothing can then move until a card finishes its touch time (see
+        `_wake()`) or cards are added to the backlog (taking cards away
+        can't make one available), unless the lane is wired to something
+        else that can change, such as a generated or chained backlog.
+        """
+        if self._standalone:
+            cards = self.backlog.cards
+            self._idle_backlog = (cards, cards._added,)
+
+    def _wake(self):
+        """Record that a card in the lane finished its touch time
+        """
+        self._idle_backlog = None
+        if isinstance(self.parent, Column):
+            self.parent._wake()
+
+    def _is_standalone(self):
+        backlog = self.backlog
+        if (
+            not isinstance(backlog, QueueCardSource) or
+            isinstance(backlog, GeneratedBacklog) or
+            getattr(backlog, 'card_source', None) is not None
+        ):
+            return False
+
+        source = backlog
+        for column in self.columns:
+            if column.card_source is not source:
+                return False
+            source = column
+
+        return True
 
     def pull(self, check=None):
-        self.donelog.pull(check)
+        pulled = self.donelog.pull(check)
 
         if self.wip_limit is not None:
             # Other than the first column, we can pull freely within the lane
             for c in reversed(self.columns[1:]):
-                c.pull(check)
+                pulled += c.pull(check)
 
             # We constrain WIP at the first column
-            current_total = sum((len(c.cards) for c in self.columns))
-            new_allowed = self.wip_limit - current_total
+            new_allowed = self.wip_limit - self._wip
             allowed_start_column = new_allowed + len(self.columns[0].cards)
 
             wip_check = lambda c: len(c.cards) < allowed_start_column and (check is None or check(c))
 
-            self.columns[0].pull(wip_check)
+            pulled += self.columns[0].pull(wip_check)
         else:
             for c in reversed(self.columns):
-                c.pull(check)
+                pulled += c.pull(check)
 
+        return pulled
 
     @property
     def cards(self):
@@ -373,7 +1334,7 @@ class Lane(TimeAware, CardContainer, PullCapable):
 
     @property
     def is_empty(self):
-        return self.backlog.is_empty and all((c.is_empty for c in self.columns))
+        return self._load == 0 and self.backlog.is_empty
 
     def __repr__(self):
         return "<Lane %s>" % self.name
@@ -412,15 +1373,26 @@ class Column(TimeAware, PullCapable, CardContainer, CardSource):
     """A column in a lane
 
     name:        name of the column
-    touch:       either a number of days or a callable returning such,
-                 indicating how long an item is worked on in this column
-                 ("touch time")
+    touch:       either a number of days or a callable (such as a
+                 distribution from `kanban_simulator.distributions`)
+                 returning such, indicating how long an item is worked on in
+                 this column ("touch time")
     wip_limit:   max number of cards allowed at any one time
     card_type:   the Card type (class) accepted, or None if all types accepted
     card_source: the CardSource where this column pulls from
 
     It is normally not necerssary to set card_source, because it is set when
     the Board is wired up in the constructor.
+
+    The column keeps its own clock, counting the days it has been ticked,
+    and indexes its cards by the time on that clock when their touch time
+    is complete, so it can tell whether any card is ready to leave without
+    looking at each card.
+
+    Work in progress can be seeded by adding cards to `cards` directly.
+    Such a card is done once it has been in the column for the touch time
+    recorded for it there with `record_touch()`, or straight away if none
+    was.
     """
 
     def __init__(self, name, touch, wip_limit=None, card_type=None, card_source=None):
@@ -431,22 +1403,98 @@ class Column(TimeAware, PullCapable, CardContainer, CardSource):
         self.card_source = card_source
         self.lane = None
 
-        self.cards = []
+        self.reset()
+
+    def reset(self):
+        """Remove all cards from the column
+        """
+        self.cards = CardQueue()
+        self._load = 0
+
+        self._clock = 0  # days ticked
+        self._entered = 0  # number of cards ever pulled
+        self._done_at = {}  # card -> (clock time when touch is complete, entry number)
+        self._pending = []  # heap of (done at, entry number, card) for cards not yet done
+        self._done = 0  # number of cards whose touch is complete
 
     def clone(self, name=None):
         column = copy.copy(self)
-        column.cards = []
+        column.reset()
 
         if name is not None:
             column.name = name
 
         return column
 
-    def tick(self, date):
+    def tick(self, date, days=1):
+        if len(self._done_at) != len(self.cards):
+            self._seen()
+
+        for card in self.cards:
+            card.tick(date, days)
+
+        self._clock += days
+
+        pending = self._pending
+        if pending and pending[0][0] <= self._clock:
+            while pending and pending[0][0] <= self._clock:
+                done_at, entry, card = heapq.heappop(pending)
+                if self._done_at.get(card, (None, None))[1] == entry:
+                    self._done += 1
+
+            # A card may have finished, so the lane may be able to pull
+            if self.lane is not None:
+                self.lane._wake()
+
+    def next_event(self):
+        if self._pending:
+            return int(math.ceil(self._pending[0][0] - self._clock))
+        return None
+
+    def _wake(self):
+        # Passed up from a sub-lane or a column of a shared WIP column
+        if self.lane is not None:
+            self.lane._wake()
+
+    def _adopt(self):
+        """Index cards added to `cards` directly rather than pulled, and
+        return how many there were
+        """
+        adopted = 0
+
         for card in self.cards:
-            card.tick(date)
+            if card not in self._done_at:
+                if card.location is not self:
+                    card.location = self
+
+                age, touch = card.progress(self)
+                self._started(card, max(0, touch - age))
+                adopted += 1
+
+        self._load += adopted
+        return adopted
+
+    def _seen(self):
+        # Cards were added to `cards` since the lane last counted them
+        adopted = self._adopt()
+        if adopted and self.lane is not None:
+            self.lane._changed(adopted, adopted)
+            self.lane._wake()
+
+    def _started(self, card, touch):
+        done_at = self._clock + touch
+        entry = self._entered
+        self._entered += 1
+
+        self._done_at[card] = (done_at, entry)
+        if done_at <= self._clock:
+            self._done += 1
+        else:
+            heapq.heappush(self._pending, (done_at, entry, card))
 
     def pull(self, check=None):
+        pulled = 0
+
         while True:
             if check is not None and not check(self):
                 break
@@ -459,26 +1507,44 @@ class Column(TimeAware, PullCapable, CardContainer, CardSource):
                 break
 
             self.cards.append(card)
+            self._load += 1
+            if self.lane is not None:
+                self.lane._changed(1, 1)
+
             card.pull_to(self)
+            pulled += 1
 
             # crystal ball time...
-            card.record_touch(self, self.touch(card) if callable(self.touch) else self.touch)
+            touch = self.touch(card) if callable(self.touch) else self.touch
+            card.record_touch(self, touch)
+            self._started(card, touch)
+
+        return pulled
 
     def next_card(self, card_type=None):
-        if len(self.cards) == 0:
+        if len(self._done_at) != len(self.cards):
+            self._seen()
+
+        # Nothing has finished its touch time
+        if self._done == 0:
             return None
 
-        card = next((c for c in self.cards if card_type is None or isinstance(c, card_type)), None)
+        card = self.cards.peek(card_type)
         if card is None:
             return None
 
-        card_history = card.history.get(self, card._new_record())
-
         # Are we done working on it?
-        if card_history['age'] < card_history['touch']:
+        if self._done_at[card][0] > self._clock:
             return None
 
-        self.cards.remove(card)
+        self.cards.popleft(card_type)
+        del self._done_at[card]
+        self._done -= 1
+
+        self._load -= 1
+        if self.lane is not None:
+            self.lane._changed(-1, -1)
+
         return card
 
     @property
@@ -531,6 +1597,9 @@ class SublaneColumn(Column):
     When a card is pulled, it must be a CardSource (e.g. an Epic). It will be set
     as the lane backlog. Only when this card source is exhausted will the card be
     allowed to be pulled into the next column in the parent lane.
+
+    Sub-lanes are cloned from the lane_template as needed. When a card leaves,
+    its sub-lane is reset and kept (up to wip_limit of them) for the next card.
     """
 
     def __init__(self, name, lane_template, wip_limit, card_type=CardSource, card_source=None):
@@ -540,33 +1609,70 @@ class SublaneColumn(Column):
         self.card_type = card_type
         self.card_source = card_source
 
+        self.lane = None
+
         self.lane_template = lane_template
         self.lanes = []
+        self._pool = []  # empty sub-lanes to reuse
+        self._load = 0  # cards in the sub-lanes, including their backlogs
 
     def clone(self):
         column = copy.copy(self)
 
         column.lane_template = self.lane_template.clone()
         column.lanes = []
+        column._pool = []
+        column._load = 0
 
         return column
 
+    def reset(self):
+        """Remove all sub-lanes from the column, keeping them for reuse
+        """
+        lanes, self.lanes = self.lanes, []
+        self._load = 0
+
+        for lane in lanes:
+            self._recycle(lane)
+
+    def _recycle(self, lane):
+        lane.parent = None
+        if isinstance(lane.backlog, QueueCardSource):
+            lane.backlog.owner = None
+
+        if self.wip_limit is None or len(self._pool) < self.wip_limit:
+            lane.reset()
+            self._pool.append(lane)
+
+    def _changed(self, wip, load):
+        self._load += load
+        if self.lane is not None:
+            self.lane._changed(0, load)
+
+    def _adopt(self):
+        return 0
+
     @property
     def cards(self):
         return [l.backlog for l in self.lanes]
 
     @property
     def is_empty(self):
-        return len(self.lanes) == 0 or all((l.is_empty for l in self.lanes))
+        return self._load == 0
 
-    def tick(self, date):
+    def tick(self, date, days=1):
         for lane in self.lanes:
-            lane.backlog.tick(date)  # tick the epic card
-            lane.tick(date)  # tick everything in the lane
+            lane.backlog.tick(date, days)  # tick the epic card
+            lane.tick(date, days)  # tick everything in the lane
+
+    def next_event(self):
+        return earliest(l.next_event() for l in self.lanes)
 
     def pull(self, check=None):
+        pulled = 0
+
         for lane in self.lanes:
-            lane.pull(check)
+            pulled += lane.pull(check)
 
         while True:
             if check is not None and not check(self):
@@ -579,14 +1685,26 @@ class SublaneColumn(Column):
             if card is None:
                 break
 
-            # Create a new lane for the card and pull
-            lane = self.lane_template.clone()
+            # Find a lane for the card and pull
+            lane = self._pool.pop() if self._pool else self.lane_template.clone()
             lane.backlog = card
-            lane.wire()
-            lane.pull(check)
+            lane.board = self.board
+            if isinstance(card, QueueCardSource):
+                card.owner = lane
+            lane.wire(force=True)
+
+            lane.parent = self
+            self._changed(0, lane._load)
+            if self.lane is not None:
+                self.lane._changed(1, 0)
+
+            pulled += lane.pull(check)
 
             self.lanes.append(lane)
             card.pull_to(self)
+            pulled += 1
+
+        return pulled
 
     def next_card(self, card_type=None):
         target_lane = None
@@ -598,6 +1716,10 @@ class SublaneColumn(Column):
 
         if target_lane is not None:
             self.lanes.remove(target_lane)
+            if self.lane is not None:
+                self.lane._changed(-1, 0)
+
+            self._recycle(target_lane)
             return target_lane.backlog
 
         return None
@@ -627,6 +1749,7 @@ class SharedWIPColumn(Column):
         self.columns = columns
         self.wip_limit = wip_limit
         self.card_source = card_source
+        self.lane = None
 
         self.wire()
 
@@ -636,6 +1759,11 @@ class SharedWIPColumn(Column):
         column.wire(force=True)
         return column
 
+    def reset(self):
+        for column in self.columns:
+            column.reset()
+        self._wip = self._load = 0
+
     def wire(self, force=False):
         source = self.card_source
 
@@ -645,6 +1773,40 @@ class SharedWIPColumn(Column):
                 column.card_source = source
             source = column
 
+        self._recount()
+
+    def _recount(self):
+        for column in self.columns:
+            column._adopt()
+
+        self._wip = sum(len(c.cards) for c in self.columns)
+        self._load = sum(c._load for c in self.columns)
+
+    def _adopt(self):
+        load = self._load
+        self._recount()
+        return self._load - load
+
+    def _changed(self, wip, load):
+        self._wip += wip
+        self._load += load
+        if self.lane is not None:
+            self.lane._changed(wip, load)
+
+    def board():
+
+        def fget(self):
+            return self._board
+
+        def fset(self, value):
+            self._board = value
+            for column in self.columns:
+                column.board = value
+
+        return locals()
+    board = property(**board())
+    _board = None
+
     @property
     def cards(self):
         return list(itertools.chain(*(c.cards for c in self.columns)))
@@ -665,29 +1827,35 @@ class SharedWIPColumn(Column):
 
     @property
     def is_empty(self):
-        return all((c.is_empty for c in self.columns))
+        return self._load == 0
 
-    def tick(self, date):
+    def tick(self, date, days=1):
         for column in self.columns:
-            column.tick(date)
+            column.tick(date, days)
+
+    def next_event(self):
+        return earliest(c.next_event() for c in self.columns)
 
     def pull(self, check=None):
+        pulled = 0
+
         if self.wip_limit is not None:
             # Other than the first column, we can pull freely within the lane
             for c in reversed(self.columns[1:]):
-                c.pull(check)
+                pulled += c.pull(check)
 
             # We constrain WIP at the first column
-            current_total = sum((len(c.cards) for c in self.columns))
-            new_allowed = self.wip_limit - current_total
+            new_allowed = self.wip_limit - self._wip
             allowed_start_column = new_allowed + len(self.columns[0].cards)
 
             wip_check = lambda c: len(c.cards) < allowed_start_column and (check is None or check(c))
 
-            self.columns[0].pull(wip_check)
+            pulled += self.columns[0].pull(wip_check)
         else:
             for c in reversed(self.columns):
-                c.pull(check)
+                pulled += c.pull(check)
+
+        return pulled
 
     def next_card(self, card_type=None):
         return self.columns[-1].next_card(card_type=card_type)
@@ -724,47 +1892,110 @@ class SharedWIPColumn(Column):
 
 class Card(TimeAware, LocationAware):
     """A card, e.g. an epic or a story.
+
+    The card's history is kept in `intervals`, a list with one
+    `[location, enter, exit, touch]` entry for each location (backlog,
+    column, donelog) the card has been pulled to, where `enter` and `exit`
+    are the first and last days (inclusive) the card was active there, or
+    None if it never was, and `touch` is the touch time recorded there.
+    Cards are ticked on consecutive days while in a location.
+
+    The `age`, `dates` and `history` attributes are computed from these
+    intervals when accessed.
+
+    Cards use `__slots__` to keep large backlogs small, so any extra
+    information about a card should be stored in `data`.
     """
 
+    __slots__ = ('name', 'data', 'touch', 'location', 'intervals',)
+
     def __init__(self, name, data=None):
         self.name = name
         self.data = data
 
-        self.age = 0
         self.touch = 0
-        self.dates = []
 
         self.location = None  # current CardContainer
-        self.history = collections.OrderedDict()  # column -> {'touch': <work duration>, 'age': <total time in column>, 'dates': <list of dates>}
+        self.intervals = []  # [location, enter, exit, touch]
+
+    @property
+    def age(self):
+        """Total number of days the card has been active
+        """
+        return sum(i[2] - i[1] + 1 for i in self.intervals if i[1] is not None)
+
+    @property
+    def dates(self):
+        """List of the days the card has been active
+        """
+        return list(itertools.chain.from_iterable(
+            range(i[1], i[2] + 1) for i in self.intervals if i[1] is not None
+        ))
+
+    @property
+    def history(self):
+        """An OrderedDict of location -> {'touch': <work duration>,
+        'age': <total time in location>, 'dates': <list of dates>}
+        """
+        history = collections.OrderedDict()
+        for location, enter, exit, touch in self.intervals:
+            record = history.setdefault(location, self._new_record())
+            record['touch'] = touch
+            if enter is not None:
+                record['age'] += exit - enter + 1
+                record['dates'].extend(range(enter, exit + 1))
+        return history
 
     def _new_record(self):
         return {'touch': 0, 'age': 0, 'dates': []}
 
-    def record_touch(self, location, touch):
-        self.touch += touch
+    def _interval(self, location):
+        for interval in reversed(self.intervals):
+            if interval[0] is location:
+                return interval
 
-        record = self.history.setdefault(location, self._new_record())
-        record['touch'] = touch
+        interval = [location, None, None, 0]
+        self.intervals.append(interval)
+        return interval
 
-    def tick(self, date):
-        self.age += 1
-        self.dates.append(date)
+    def progress(self, location):
+        """Return a tuple of (age, touch) for the card in `location`
+        """
+        age = touch = 0
+        for interval in self.intervals:
+            if interval[0] is location:
+                touch = interval[3]
+                if interval[1] is not None:
+                    age += interval[2] - interval[1] + 1
+        return age, touch
 
-        record = self.history.setdefault(self.location, self._new_record())
-        record['age'] += 1
-        record['dates'].append(date)
+    def record_touch(self, location, touch):
+        self.touch += touch
+        self._interval(location)[3] = touch
+
+    def tick(self, date, days=1):
+        interval = self._interval(self.location)
+        if interval[1] is None:
+            interval[1] = date - days + 1
+        interval[2] = date
 
     def pull_to(self, location):
-        self.history.setdefault(location, self._new_record())
+        source = self.location
+
+        self.intervals.append([location, None, None, 0])
         self.location = location
 
+        board = getattr(location, 'board', None)
+        if board is not None and board.listeners:
+            board._moved(self, source, location)
+
     def __repr__(self):
         return "<Card %s>" % self.name
 
     def to_html(self):
         return "<div class='card'>%s[%d,%d]</div>" % (
             self.name,
-            self.history.get(self.location, {}).get('age', 0),
+            self.progress(self.location)[0],
             self.age,
         )
 
@@ -772,8 +2003,12 @@ class Epic(Card, QueueCardSource):
     """An epic, which may be split into stories later.
 
     The splits dict contains column names as keys and a
-    number representing the number of stories to split into
-    as the epic enters the desired column.
+    number (or a callable, such as a distribution, returning one)
+    representing the number of stories to split into
+    as the epic enters the desired column. All the stories split
+    from the epic are kept in `stories`, unless the board's donelog keeps
+    only summaries or stats of finished cards (see `Donelog`), so that
+    finished stories are not kept alive.
     """
 
     def __init__(self, name, data=None, splits={}):
@@ -781,6 +2016,7 @@ class Epic(Card, QueueCardSource):
         Card.__init__(self, name, data)
 
         self.splits = splits
+        self.stories = []
 
     def pull_to(self, location):
         super(Epic, self).pull_to(location)
@@ -788,10 +2024,21 @@ class Epic(Card, QueueCardSource):
         if location is not None and location.name in self.splits:
             split = self.splits[location.name]
 
-            self.cards.extend([
+            stories = [
                 Story("%s-%02d" % (self.name, i + 1,), parent_epic=self)
                 for i in range(split(self) if callable(split) else split)
-            ])
+            ]
+
+            board = getattr(location, 'board', None)
+
+            self.cards.extend(stories)
+            if board is None or board.donelog.retention == 'cards':
+                self.stories.extend(stories)
+            if self.owner is not None:
+                self.owner._changed(0, len(stories))
+
+            if board is not None:
+                board._split(self, stories)
 
     def __repr__(self):
         return "<Epic %s>" % self.name
@@ -800,6 +2047,8 @@ class Story(Card):
     """A story, possibly with a parent epic.
     """
 
+    __slots__ = ('parent_epic',)
+
     def __init__(self, name, data=None, parent_epic=None):
         super(Story, self).__init__(name, data)
         self.parent_epic = parent_epic
@@ -0,0 +1,155 @@
+"""An on-disk cache of Monte Carlo results, so that re-running the same
+forecast (after restarting a notebook, say) doesn't cost any CPU::
+
+    board.run_monte_carlo_simulation(trials=1000, seed=42, summary=True, cache="~/.kanban-cache")
+
+Results are keyed by a fingerprint of the board (see
+`BoardTemplate.fingerprint()`), the master seed, `max_days` and the
+engine. Per-trial seeds derived from a master seed don't depend on the
+number of trials, so a cached run of 1000 trials can be extended to 5000
+by running just the 4000 missing trials.
+
+Each entry is a small JSON file of `TrialSummary` records. When the files
+take up more than `max_size` bytes, the least recently used are removed.
+"""
+
+import os
+import json
+import errno
+import hashlib
+import itertools
+
+from kanban_simulator import montecarlo
+from kanban_simulator.board import BoardTemplate
+
+# Atomic on all platforms in Python 3; `os.rename` is atomic on POSIX
+_replace = getattr(os, 'replace', os.rename)
+
+
+class ResultCache(object):
+    """A cache of Monte Carlo results in the directory `path`, which is
+    created if needed, using at most about `max_size` bytes.
+    """
+
+    def __init__(self, path, max_size=100 * 1024 * 1024):
+        self.path = os.path.expanduser(path)
+        self.max_size = max_size
+
+        try:
+            os.makedirs(self.path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def key(self, board, seed, max_days=100000, engine='tick'):
+        """Return the cache key for trials of `board` (or a `BoardTemplate`
+        of it), or None if the board can't be fingerprinted
+        """
+
+        template = board if isinstance(board, BoardTemplate) else board.compile()
+        fingerprint = template.fingerprint()
+        if fingerprint is None:
+            return None
+
+        return hashlib.sha1(repr((fingerprint, seed, max_days, engine,)).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the list of `TrialSummary` records stored under `key`, in
+        trial order, or an empty list
+        """
+
+        filename = self._filename(key)
+        try:
+            with open(filename) as f:
+                rows = json.load(f)
+        except (IOError, OSError, ValueError):
+            return []
+
+        # Mark as recently used
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+
+        return [montecarlo.TrialSummary(*row) for row in rows]
+
+    def put(self, key, results):
+        """Store the list of `TrialSummary` records `results`, in trial
+        order, under `key`, then evict old entries if the cache is too big
+        """
+
+        filename = self._filename(key)
+        temp = "%s.%d.tmp" % (filename, os.getpid(),)
+
+        with open(temp, 'w') as f:
+            json.dump([list(r) for r in results], f)
+        _replace(temp, filename)
+
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache takes up
+        no more than `max_size` bytes
+        """
+
+        entries = []
+        total = 0
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name,))
+            total += stat.st_size
+
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Remove every entry
+        """
+
+        for name in os.listdir(self.path):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.path, name))
+
+    def run_trials(self, board, seed, trials, max_days=100000, processes=1, engine='tick', coordinator=None):
+        """Return `TrialSummary` records for the first `trials` trials of
+        `board` with the master `seed`, in trial order, running (and then
+        caching) only those that aren't cached yet, on the workers of
+        `coordinator` if given.
+        """
+
+        template = board.compile()
+        key = self.key(template, seed, max_days, engine)
+
+        cached = self.get(key) if key is not None else []
+        if len(cached) >= trials:
+            return cached[:trials]
+
+        seeds = list(itertools.islice(montecarlo.iter_seeds(seed), len(cached), trials))
+        if coordinator is not None:
+            results = cached + coordinator.run_trials(
+                template, seeds, max_days=max_days, engine=engine, first_trial=len(cached)
+            )
+        else:
+            results = cached + montecarlo.run_trials(
+                template, seeds, max_days=max_days, processes=processes, summary=True, engine=engine,
+                first_trial=len(cached)
+            )
+
+        if key is not None:
+            self.put(key, results)
+
+        return results
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + ".json")
@@ -0,0 +1,282 @@
+"""Run Monte Carlo trials on worker processes on any number of machines,
+coordinated over a socket.
+
+A `Coordinator` listens on an address. Workers, started with `run_worker()`
+or from the command line, connect to it::
+
+    python -m kanban_simulator.cluster worker coordinator-host:6000 --authkey secret
+
+The coordinator sends each worker the board (once per board) and then
+ranges of trial seeds, and merges the `TrialSummary` records they send
+back. If a worker dies, or takes longer than `task_timeout` seconds over a
+range, its range is given to another worker. Results are the same as for
+`Board.run_monte_carlo_simulation()` with the same seed::
+
+    with Coordinator(('0.0.0.0', 6000), authkey=b"secret") as coordinator:
+        results = board.run_monte_carlo_simulation(trials=50000, seed=42, summary=True, coordinator=coordinator)
+
+Messages are pickled, so only run workers and coordinators that trust each
+other, with a shared `authkey`. For testing on one machine,
+`start_workers()` starts local worker processes.
+"""
+
+import sys
+import time
+import argparse
+import threading
+import traceback
+import collections
+import multiprocessing
+
+from multiprocessing.connection import Listener, Client, wait
+
+from kanban_simulator import montecarlo
+
+
+class WorkerError(Exception):
+    """A worker failed to run a trial
+    """
+
+
+class Coordinator(object):
+    """Hands out trials to workers that connect to `address`, a
+    `(host, port)` tuple (port 0 picks a free port; see `address`).
+
+    `authkey` is a shared secret (bytes) that workers must also use.
+    """
+
+    def __init__(self, address=('localhost', 0), authkey=None, chunk_size=100, task_timeout=None):
+        if not authkey:
+            raise ValueError("An authkey is required")
+
+        self.chunk_size = chunk_size
+        self.task_timeout = task_timeout
+
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+
+        self._workers = []  # connected workers
+        self._new = []  # workers that connected since we last looked
+        self._lock = threading.Lock()
+        self._job = 0
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._accept)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def workers(self):
+        """The number of connected workers
+        """
+        self._adopt()
+        return len(self._workers)
+
+    def close(self):
+        """Tell the workers to stop, and stop listening
+        """
+
+        self._closed = True
+        self._adopt()
+
+        for conn in self._workers:
+            try:
+                conn.send(('stop',))
+                conn.close()
+            except (IOError, OSError):
+                pass
+
+        self._workers = []
+        self._listener.close()
+
+    def run_trials(self, board, seeds, max_days=100000, engine='tick', first_trial=0):
+        """Run one trial of `board` per seed in `seeds` on the workers, and
+        return a list of `TrialSummary` records in the same order as
+        `seeds`, like `montecarlo.run_trials(summary=True)`.
+
+        Waits for workers to connect if there are none.
+        """
+
+        template = board.compile()
+        montecarlo.require_local(template)
+
+        self._job += 1
+        job = (self._job, montecarlo.dumps(template), max_days, engine,)
+
+        seeds = list(seeds)
+        pending = collections.deque(
+            (first_trial + i, seeds[i:i + self.chunk_size],)
+            for i in range(0, len(seeds), self.chunk_size)
+        )
+        remaining = len(pending)
+        results = {}
+
+        has_job = set()  # workers that have been sent this job
+        assigned = {}  # worker -> (range, deadline)
+
+        while remaining:
+            self._adopt()
+
+            # Give idle workers something to do
+            for conn in list(self._workers):
+                if conn in assigned or not pending:
+                    continue
+
+                task = pending.popleft()
+                try:
+                    if conn not in has_job:
+                        conn.send(('job',) + job)
+                        has_job.add(conn)
+                    conn.send(('range', job[0],) + task)
+                except (IOError, OSError):
+                    self._drop(conn)
+                    pending.appendleft(task)
+                    continue
+
+                deadline = time.time() + self.task_timeout if self.task_timeout is not None else None
+                assigned[conn] = (task, deadline,)
+
+            # Collect results, and notice workers that have gone away
+            for conn in wait(self._workers, 0.1):
+                try:
+                    message = conn.recv()
+                except (EOFError, IOError, OSError):
+                    self._drop(conn)
+                    if conn in assigned:
+                        pending.appendleft(assigned.pop(conn)[0])
+                    continue
+
+                kind, message_job, first, data = message
+                if message_job != job[0] or conn not in assigned:
+                    continue
+
+                del assigned[conn]
+
+                if kind == 'error':
+                    raise WorkerError(data)
+
+                if first not in results:
+                    results[first] = [montecarlo.TrialSummary(*row) for row in data]
+                    remaining -= 1
+
+            # Give up on workers that are taking too long
+            now = time.time()
+            for conn, (task, deadline) in list(assigned.items()):
+                if deadline is not None and now > deadline:
+                    self._drop(conn)
+                    del assigned[conn]
+                    pending.appendleft(task)
+
+        return [result for first in sorted(results) for result in results[first]]
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (IOError, OSError, EOFError):
+                if self._closed:
+                    return
+                continue
+            except multiprocessing.AuthenticationError:
+                continue
+
+            with self._lock:
+                self._new.append(conn)
+
+    def _adopt(self):
+        with self._lock:
+            self._workers.extend(self._new)
+            self._new = []
+
+    def _drop(self, conn):
+        if conn in self._workers:
+            self._workers.remove(conn)
+        try:
+            conn.close()
+        except (IOError, OSError):
+            pass
+
+
+def run_worker(address, authkey):
+    """Connect to the coordinator at `address` and run the trials it sends
+    until it tells us to stop or goes away
+    """
+
+    conn = Client(address, authkey=authkey)
+    jobs = {}
+
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, IOError, OSError):
+                break
+
+            if message[0] == 'stop':
+                break
+
+            if message[0] == 'job':
+                job, payload, max_days, engine = message[1:]
+                jobs.clear()  # the coordinator runs one job at a time
+                jobs[job] = (montecarlo.loads(payload), max_days, engine,)
+                continue
+
+            job, first, seeds = message[1:]
+            template, max_days, engine = jobs[job]
+
+            try:
+                results = montecarlo.run_trials(
+                    template, seeds, max_days=max_days, summary=True, engine=engine, first_trial=first
+                )
+            except Exception:
+                conn.send(('error', job, first, traceback.format_exc(),))
+            else:
+                conn.send(('results', job, first, [tuple(r) for r in results],))
+    finally:
+        conn.close()
+
+
+def start_workers(address, authkey, processes=None):
+    """Start `processes` (by default, one per CPU) local worker processes
+    connecting to `address`, and return them
+    """
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    workers = [multiprocessing.Process(target=run_worker, args=(address, authkey,)) for _ in range(processes)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    return workers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a Kanban simulator Monte Carlo worker")
+    parser.add_argument('command', choices=['worker'])
+    parser.add_argument('address', help="host:port of the coordinator")
+    parser.add_argument('--authkey', required=True, help="shared secret")
+    parser.add_argument('--processes', type=int, default=1, help="number of worker processes to run")
+    args = parser.parse_args(argv)
+
+    host, port = args.address.rsplit(':', 1)
+    address = (host, int(port),)
+    authkey = args.authkey.encode('utf-8')
+
+    if args.processes == 1:
+        run_worker(address, authkey)
+    else:
+        for worker in start_workers(address, authkey, args.processes):
+            worker.join()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""Save boards to, and load them from, plain definitions: dicts of lists,
+strings and numbers that can be written as JSON or YAML::
+
+    text = to_yaml(board)
+    board = from_yaml(text)
+
+A definition looks like this (in YAML)::
+
+    name: Test
+    backlog:
+      cards:
+      - {type: Epic, name: Epic 1, splits: {Build: 5}}
+    lanes:
+    - name: Team 1
+      wip_limit: 3
+      columns:
+      - {type: Column, name: Discovery, touch: {distribution: UniformInt, low: 5, high: 10},
+         wip_limit: 1, card_type: Epic}
+      - type: SublaneColumn
+        name: Build
+        wip_limit: 1
+        card_type: Epic
+        lane:
+          name: Build
+          columns:
+          - {type: Column, name: Development, touch: 2, wip_limit: 3, card_type: Story}
+
+`touch` times and `splits` must be numbers or distributions (see
+`kanban_simulator.distributions`); other callables can't be saved. A
+distribution with a `seed` has its own generator, so one used in several
+places is saved once with an `id`, and then as `{ref: <id>}`, to share one
+generator again when loaded. Card types other than those of
+`kanban_simulator.board` are saved as "module.Class" and imported when
+loaded. Only boards that haven't started can be saved.
+
+YAML support requires PyYAML.
+"""
+
+import json
+import importlib
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from kanban_simulator import board as kb
+from kanban_simulator import distributions
+
+
+_CARD_TYPES = dict((cls.__name__, cls) for cls in (kb.Card, kb.Story, kb.Epic, kb.CardSource))
+
+
+def to_dict(board):
+    """Return the definition of `board`, which hasn't started yet
+    """
+
+    if board._load or board.donelog.stats.count:
+        raise ValueError("Only boards that haven't started can be saved")
+
+    # Seeded distributions by id(), so that each is saved once
+    memo = {}
+
+    data = {
+        'name': board.name,
+        'backlog': _backlog_to_dict(board.backlog, memo),
+        'lanes': [_lane_to_dict(lane, memo, board.backlog) for lane in board.lanes],
+    }
+
+    if board.donelog.retention != 'cards':
+        data['retention'] = board.donelog.retention
+
+    return data
+
+
+def from_dict(data):
+    """Return a new board built from the definition `data`
+    """
+
+    # Seeded distributions by id, and equal unseeded ones, which draw from
+    # the global generator, are shared, as they are between cloned lanes
+    memo = {}
+    _shared_from_dict(data, memo)
+
+    backlog = _backlog_from_dict(data.get('backlog', {}), memo)
+    lanes = [_lane_from_dict(lane, memo) for lane in data['lanes']]
+    return kb.Board(data['name'], lanes, backlog, retention=data.get('retention', 'cards'))
+
+
+def to_json(board, **kwargs):
+    """Return the definition of `board` as JSON. `kwargs` are passed to
+    `json.dumps()`.
+    """
+
+    kwargs.setdefault('indent', 2)
+    return json.dumps(to_dict(board), **kwargs)
+
+
+def from_json(text):
+    """Return a new board built from a JSON definition
+    """
+
+    return from_dict(json.loads(text))
+
+
+def to_yaml(board):
+    """Return the definition of `board` as YAML
+    """
+
+    return _yaml().safe_dump(to_dict(board), default_flow_style=False)
+
+
+def from_yaml(text):
+    """Return a new board built from a YAML definition
+    """
+
+    return from_dict(_yaml().safe_load(text))
+
+
+def _yaml():
+    if yaml is None:
+        raise ImportError("PyYAML is required to read and write YAML definitions")
+    return yaml
+
+#
+# Saving
+#
+
+def _backlog_to_dict(backlog, memo):
+    if kb.base_class(backlog) is not kb.Backlog or backlog.card_source is not None:
+        raise ValueError("Only plain backlogs can be saved, not %r" % backlog)
+
+    data = {'cards': [_card_to_dict(card, memo) for card in backlog.cards]}
+    if backlog.name != "Backlog":
+        data['name'] = backlog.name
+    return data
+
+
+def _card_to_dict(card, memo):
+    data = {'type': _type_name(type(card)), 'name': card.name}
+
+    if card.data is not None:
+        data['data'] = card.data
+
+    if isinstance(card, kb.Epic):
+        if card.splits:
+            data['splits'] = dict(
+                (column, _value_to_dict(split, "split of %s in %s" % (card.name, column,), memo),)
+                for column, split in card.splits.items()
+            )
+        if len(card.cards):
+            data['cards'] = [_card_to_dict(c, memo) for c in card.cards]
+
+    return data
+
+
+def _lane_to_dict(lane, memo, board_backlog=None):
+    data = {
+        'name': lane.name,
+        'columns': [_column_to_dict(column, memo) for column in lane.columns],
+    }
+
+    if lane.wip_limit is not None:
+        data['wip_limit'] = lane.wip_limit
+    if lane.backlog is not None and lane.backlog is not board_backlog:
+        data['backlog'] = _backlog_to_dict(lane.backlog, memo)
+
+    return data
+
+
+def _column_to_dict(column, memo):
+    column_class = kb.base_class(column)
+    data = {'type': column_class.__name__, 'name': column.name}
+
+    if column_class is kb.Column:
+        data['touch'] = _value_to_dict(column.touch, "touch of %s" % column.name, memo)
+    elif column_class is kb.SublaneColumn:
+        data['lane'] = _lane_to_dict(column.lane_template, memo)
+    elif column_class is kb.SharedWIPColumn:
+        data['columns'] = [_column_to_dict(c, memo) for c in column.columns]
+    elif column_class is not kb.QueueColumn:
+        raise ValueError("Column %s is a %s, which can't be saved" % (column.name, column_class.__name__,))
+
+    if column.wip_limit is not None:
+        data['wip_limit'] = column.wip_limit
+    if getattr(column, 'card_type', None) is not None:
+        data['card_type'] = _type_name(column.card_type)
+
+    return data
+
+
+def _value_to_dict(value, what, memo):
+    if isinstance(value, distributions.Distribution):
+        if value.seed is None:
+            return value.to_dict()
+
+        ref = memo.get(id(value))
+        if ref is not None:
+            return {'ref': ref}
+
+        ref = memo[id(value)] = len(memo) + 1
+        data = value.to_dict()
+        data['id'] = ref
+        return data
+    if callable(value):
+        raise ValueError("The %s is a callable, which can't be saved; use a distribution" % what)
+    return value
+
+
+def _type_name(cls):
+    if _CARD_TYPES.get(cls.__name__) is cls:
+        return cls.__name__
+    return "%s.%s" % (cls.__module__, cls.__name__,)
+
+#
+# Loading
+#
+
+def _backlog_from_dict(data, memo):
+    return kb.Backlog(
+        name=data.get('name', "Backlog"),
+        cards=[_card_from_dict(c, memo) for c in data.get('cards', [])],
+    )
+
+
+def _card_from_dict(data, memo):
+    cls = _type(data.get('type', 'Card'))
+
+    if issubclass(cls, kb.Epic):
+        card = cls(data['name'], data=data.get('data'), splits=dict(
+            (column, _value_from_dict(split, memo),) for column, split in data.get('splits', {}).items()
+        ))
+        card.cards.extend([_card_from_dict(c, memo) for c in data.get('cards', [])])
+        return card
+
+    return cls(data['name'], data=data.get('data'))
+
+
+def _lane_from_dict(data, memo):
+    backlog = _backlog_from_dict(data['backlog'], memo) if 'backlog' in data else None
+    return kb.Lane(
+        data['name'],
+        [_column_from_dict(column, memo) for column in data['columns']],
+        backlog=backlog,
+        wip_limit=data.get('wip_limit'),
+    )
+
+
+def _column_from_dict(data, memo):
+    kind = data.get('type', 'Column')
+    name = data['name']
+    wip_limit = data.get('wip_limit')
+    card_type = _type(data['card_type']) if 'card_type' in data else None
+
+    if kind == 'Column':
+        return kb.Column(name, _value_from_dict(data['touch'], memo), wip_limit=wip_limit, card_type=card_type)
+    if kind == 'QueueColumn':
+        return kb.QueueColumn(name, wip_limit=wip_limit, card_type=card_type)
+    if kind == 'SublaneColumn':
+        return kb.SublaneColumn(
+            name, _lane_from_dict(data['lane'], memo), wip_limit,
+            card_type=card_type if card_type is not None else kb.CardSource,
+        )
+    if kind == 'SharedWIPColumn':
+        return kb.SharedWIPColumn(name, [_column_from_dict(c, memo) for c in data['columns']], wip_limit)
+
+    raise ValueError("Unknown column type %r" % kind)
+
+
+def _value_from_dict(value, memo):
+    if not isinstance(value, dict):
+        return value
+
+    ref = value.get('ref', value.get('id'))
+    if ref is not None:
+        try:
+            return memo[('ref', ref,)]
+        except KeyError:
+            raise ValueError("Unknown distribution ref %r" % ref)
+
+    dist = distributions.from_dict(value)
+    if dist.seed is None:
+        return memo.setdefault(dist, dist)
+    return dist
+
+
+def _shared_from_dict(data, memo):
+    """Load every distribution in `data` that has an `id` into `memo`
+    first, as keys may have been sorted so that a `ref` comes before it
+    """
+
+    if isinstance(data, dict):
+        if 'distribution' in data and 'id' in data:
+            data = dict(data)
+            ref = data.pop('id')
+            memo[('ref', ref,)] = distributions.from_dict(data)
+            return
+        data = [value for key, value in data.items() if key != 'data']
+    elif not isinstance(data, list):
+        return
+
+    for item in data:
+        _shared_from_dict(item, memo)
+
+
+def _type(name):
+    if name in _CARD_TYPES:
+        return _CARD_TYPES[name]
+
+    module, _, cls = name.rpartition('.')
+    if not module:
+        raise ValueError("Unknown card type %r" % name)
+    return getattr(importlib.import_module(module), cls)
@@ -0,0 +1,269 @@
+"""Distributions of touch times and splits that, unlike lambdas, can be
+pickled, compared, hashed and saved in a board definition (see
+`kanban_simulator.definition`)::
+
+    Column(name="Development", touch=UniformInt(5, 10), wip_limit=3)
+    Epic("Epic 1", splits={'Build': Triangular(3, 12, 5, whole=True)})
+
+A distribution is called with the card, like a `touch` or `splits`
+callable, and returns one value. `sample(n)` returns `n` values at once.
+
+By default, values are drawn from the global random number generator, which
+Monte Carlo simulations seed for each trial. A distribution given a `seed`
+has its own generator instead. Monte Carlo simulations reseed it for each
+trial from the trial seed and its own seed, so give each distribution on a
+board a different seed unless they should draw the same values.
+"""
+
+import abc
+import math
+import random
+
+from kanban_simulator.board import ABC
+
+
+class Distribution(ABC):
+    """Base class for distributions. Subclasses implement `draw()` and list
+    the names of their parameters in `params`.
+    """
+
+    params = ()
+
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.rng = random.Random(seed) if seed is not None else None
+
+    @abc.abstractmethod
+    def draw(self, rng):
+        """Return one value drawn using `rng`
+        """
+
+    def __call__(self, card=None):
+        return self.draw(self.rng if self.rng is not None else random)
+
+    def sample(self, n):
+        """Return a list of `n` values, the same as calling the distribution
+        `n` times
+        """
+        rng = self.rng if self.rng is not None else random
+        draw = self.draw
+        return [draw(rng) for _ in range(n)]
+
+    def reseed(self, seed):
+        """Reseed the distribution's own generator, if it has one, for the
+        trial with the given `seed`
+        """
+        if self.rng is not None:
+            self.rng.seed(seed * 2 ** 32 + self.seed)
+
+    def to_dict(self):
+        """Return a dict describing the distribution, which `from_dict()`
+        turns back into one
+        """
+        data = {'distribution': type(self).__name__}
+        for name in self.params:
+            value = getattr(self, name)
+            data[name] = list(value) if isinstance(value, tuple) else value
+        if getattr(self, 'whole', False):
+            data['whole'] = True
+        if self.seed is not None:
+            data['seed'] = self.seed
+        return data
+
+    def _key(self):
+        return (type(self), self.seed, getattr(self, 'whole', False),) + tuple(getattr(self, n) for n in self.params)
+
+    def __eq__(self, other):
+        return isinstance(other, Distribution) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        args = [repr(getattr(self, name)) for name in self.params]
+        if getattr(self, 'whole', False):
+            args.append("whole=True")
+        if self.seed is not None:
+            args.append("seed=%r" % self.seed)
+        return "%s(%s)" % (type(self).__name__, ", ".join(args),)
+
+
+class Fixed(Distribution):
+    """Always `value`
+    """
+
+    params = ('value',)
+
+    def __init__(self, value, seed=None):
+        super(Fixed, self).__init__(seed)
+        self.value = value
+
+    def draw(self, rng):
+        return self.value
+
+    def sample(self, n):
+        return [self.value] * n
+
+
+class UniformInt(Distribution):
+    """A whole number from `low` to `high` inclusive, each equally likely,
+    like `random.randint()`
+    """
+
+    params = ('low', 'high',)
+
+    def __init__(self, low, high, seed=None):
+        if low > high:
+            raise ValueError("low must not be more than high")
+
+        super(UniformInt, self).__init__(seed)
+        self.low = low
+        self.high = high
+
+    def draw(self, rng):
+        return rng.randint(self.low, self.high)
+
+
+class Triangular(Distribution):
+    """A number from `low` to `high`, most likely near `mode` (by default,
+    halfway between), like `random.triangular()`. If `whole` is True,
+    values are rounded up to whole numbers, as needed for splits.
+    """
+
+    params = ('low', 'high', 'mode',)
+
+    def __init__(self, low, high, mode=None, whole=False, seed=None):
+        if low > high:
+            raise ValueError("low must not be more than high")
+
+        super(Triangular, self).__init__(seed)
+        self.low = low
+        self.high = high
+        self.mode = mode
+        self.whole = whole
+
+    def draw(self, rng):
+        value = rng.triangular(self.low, self.high, self.mode)
+        return int(math.ceil(value)) if self.whole else value
+
+
+class LogNormal(Distribution):
+    """A number whose natural logarithm is normally distributed with mean
+    `mu` and standard deviation `sigma`, like `random.lognormvariate()`:
+    usually small, with a long tail, as touch times often are. The median
+    is `exp(mu)`. If `whole` is True, values are rounded up to whole
+    numbers.
+    """
+
+    params = ('mu', 'sigma',)
+
+    def __init__(self, mu, sigma, whole=False, seed=None):
+        if sigma < 0:
+            raise ValueError("sigma must not be negative")
+
+        super(LogNormal, self).__init__(seed)
+        self.mu = mu
+        self.sigma = sigma
+        self.whole = whole
+
+    def draw(self, rng):
+        value = rng.lognormvariate(self.mu, self.sigma)
+        return int(math.ceil(value)) if self.whole else value
+
+
+class Empirical(Distribution):
+    """One of `values`, e.g. touch times measured on a real board, each
+    equally likely
+    """
+
+    params = ('values',)
+
+    def __init__(self, values, seed=None):
+        if not values:
+            raise ValueError("values must not be empty")
+
+        super(Empirical, self).__init__(seed)
+        self.values = tuple(values)
+
+    def draw(self, rng):
+        return rng.choice(self.values)
+
+
+DISTRIBUTIONS = dict((cls.__name__, cls) for cls in (Fixed, UniformInt, Triangular, LogNormal, Empirical))
+
+
+def from_dict(data):
+    """Return the distribution described by `data`, as returned by
+    `Distribution.to_dict()`
+    """
+
+    data = dict(data)
+    name = data.pop('distribution')
+    try:
+        cls = DISTRIBUTIONS[name]
+    except KeyError:
+        raise ValueError("Unknown distribution %r" % name)
+
+    return cls(**data)
+
+
+def iter_distributions(board):
+    """Yield every distribution used for a `touch` or `splits` on `board`,
+    including those of cards in progress and of sub-lanes. A distribution
+    used in several places may be yielded more than once.
+    """
+
+    from kanban_simulator import board as kb
+
+    def in_cards(cards):
+        for card in cards:
+            if isinstance(card, kb.Epic):
+                for split in card.splits.values():
+                    if isinstance(split, Distribution):
+                        yield split
+                for dist in in_cards(card.cards):
+                    yield dist
+
+    def lane(lane):
+        if lane.backlog is not board.backlog:
+            for dist in in_cards(getattr(lane.backlog, 'cards', ())):
+                yield dist
+        for column in lane.columns:
+            for dist in column_(column):
+                yield dist
+
+    def column_(column):
+        if isinstance(column, kb.SharedWIPColumn):
+            for child in column.columns:
+                for dist in column_(child):
+                    yield dist
+            return
+
+        if isinstance(column.touch, Distribution):
+            yield column.touch
+        for dist in in_cards(column.cards):
+            yield dist
+
+        if isinstance(column, kb.SublaneColumn):
+            for sublane in [column.lane_template] + column.lanes + column._pool:
+                for dist in lane(sublane):
+                    yield dist
+
+    for dist in in_cards(getattr(board.backlog, 'cards', ())):
+        yield dist
+    for board_lane in board.lanes:
+        for dist in lane(board_lane):
+            yield dist
+
+
+def reseed(board, seed):
+    """Reseed the distributions on `board` that have their own generator
+    for the trial with the given `seed`
+    """
+
+    for dist in iter_distributions(board):
+        if dist.rng is not None:
+            dist.reseed(seed)
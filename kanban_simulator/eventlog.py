@@ -0,0 +1,385 @@
+"""A compact, append-only binary log of what happens on a board, and a
+reader that memory-maps it.
+
+An `EventLog` is a `BoardListener` that writes one fixed-width record per
+event: a card being pulled onto the board, moving between locations,
+being split into stories, or reaching a donelog. Names of cards and
+locations are written once each to a separate names file next to the log.
+Add it to a single board, or pass it to `run_monte_carlo_simulation()` to
+log every trial::
+
+    with EventLog("trace.log") as log:
+        board.run_monte_carlo_simulation(trials=1000, summary=True, listeners=[log])
+
+    reader = EventLogReader("trace.log")
+    for event in reader.query(trial=3, days=(10, 20)):
+        print event
+
+Records are appended in trial and day order, even when appending to an
+existing log, so queries by trial and day range use a binary search rather
+than reading the whole log. Queries by card use an index of each card's
+records, built the first time one is needed. If NumPy is
+installed, `EventLogReader.array()` gives a zero-copy structured array
+view of the records for vectorised analysis.
+"""
+
+import os
+import json
+import mmap
+import array
+import bisect
+import struct
+import collections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from kanban_simulator.board import BoardListener, Donelog, location_path
+
+# Event kinds
+PULL = 1   # card pulled onto the board, from the backlog or an epic
+MOVE = 2   # card moved from one location to another
+SPLIT = 3  # epic split into stories; value is the number of stories
+DONE = 4   # card pulled into a donelog
+
+KIND_NAMES = {PULL: 'pull', MOVE: 'move', SPLIT: 'split', DONE: 'done'}
+
+NONE = 0xFFFFFFFF  # id for no location
+
+# trial, day, kind, card, source, target, value
+RECORD = struct.Struct('<IIB3xIIIi')
+
+Event = collections.namedtuple('Event', ['trial', 'day', 'kind', 'card', 'source', 'target', 'value'])
+Event.__doc__ = """An event read from a log:
+
+trial:  the trial number
+day:    the day of the simulation
+kind:   'pull', 'move', 'split' or 'done'
+card:   name of the card
+source: name of the location the card left, or None
+target: name of the location the card moved to, or None for splits
+value:  for moves out of a location, the days the card was active there;
+        for splits, the number of stories
+"""
+
+
+def names_path(path):
+    return path + ".names"
+
+
+class EventLog(BoardListener):
+    """Writes the events of a board, or of each trial of a Monte Carlo
+    simulation, to the file at `path`, which is created or appended to.
+
+    Cards are identified by name and locations by `location_path()`, so
+    the same card or column has the same id in every trial.
+
+    Trials are numbered so that the log stays in trial order: when a trial
+    would be numbered no higher than one already logged, as when appending
+    to an existing log or logging a second Monte Carlo simulation, it and
+    the trials after it carry on from the last trial logged.
+
+    Call `close()` (or use the log as a context manager) when done.
+    """
+
+    def __init__(self, path, trial=0):
+        self.path = path
+
+        self._cards = {}  # name -> id
+        self._locations = {}  # path -> id
+        self._location_ids = {}  # location -> id, for the current trial
+
+        self._offset = 0  # added to trial numbers
+        self._last_trial = None  # highest trial number logged
+
+        # Carry on from an existing log
+        if os.path.exists(names_path(path)):
+            with open(names_path(path)) as f:
+                for line in f:
+                    kind, name_id, name = json.loads(line)
+                    (self._cards if kind == 'card' else self._locations)[name] = name_id
+
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                count = os.fstat(f.fileno()).st_size // RECORD.size
+                if count:
+                    f.seek((count - 1) * RECORD.size)
+                    self._last_trial = RECORD.unpack(f.read(RECORD.size))[0]
+
+        self.trial = self._number(trial)
+
+        self._file = open(path, 'ab')
+        self._names = open(names_path(path), 'a')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._file.close()
+        self._names.close()
+
+    def start_trial(self, trial, seed):
+        self.trial = self._last_trial = self._number(trial)
+        self._location_ids = {}
+
+    def card_moved(self, board, card, source, target):
+        if source is None:
+            kind, value = PULL, 0
+        else:
+            kind = DONE if isinstance(target, Donelog) else MOVE
+            enter, exit = card.intervals[-2][1:3]
+            value = exit - enter + 1 if enter is not None else 0
+
+        self._file.write(RECORD.pack(
+            self.trial,
+            board.day,
+            kind,
+            self._card_id(card),
+            self._location_id(source) if source is not None else NONE,
+            self._location_id(target),
+            value,
+        ))
+
+    def card_split(self, board, epic, stories):
+        location = self._location_id(epic.location)
+        self._file.write(RECORD.pack(self.trial, board.day, SPLIT, self._card_id(epic), location, NONE, len(stories)))
+
+    def _number(self, trial):
+        if self._last_trial is not None and self._offset + trial <= self._last_trial:
+            self._offset = self._last_trial + 1 - trial
+        return self._offset + trial
+
+    def _card_id(self, card):
+        card_id = self._cards.get(card.name)
+        if card_id is None:
+            card_id = self._cards[card.name] = len(self._cards)
+            self._write_name('card', card_id, card.name)
+        return card_id
+
+    def _location_id(self, location):
+        location_id = self._location_ids.get(location)
+        if location_id is None:
+            path = location_path(location)
+            location_id = self._locations.get(path)
+            if location_id is None:
+                location_id = self._locations[path] = len(self._locations)
+                self._write_name('location', location_id, path)
+            self._location_ids[location] = location_id
+        return location_id
+
+    def _write_name(self, kind, name_id, name):
+        self._names.write(json.dumps([kind, name_id, name]))
+        self._names.write("\n")
+
+
+class EventLogReader(object):
+    """Reads a log written by `EventLog` by memory-mapping it.
+
+    `len(reader)` is the number of records, and `reader[i]` the `Event` at
+    index `i`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        self.card_names = {}  # id -> name
+        self.card_ids = {}  # name -> id
+        self.location_names = {}
+
+        with open(names_path(path)) as f:
+            for line in f:
+                kind, name_id, name = json.loads(line)
+                if kind == 'card':
+                    self.card_names[name_id] = name
+                    self.card_ids[name] = name_id
+                else:
+                    self.location_names[name_id] = name
+
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._count = size // RECORD.size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        self._trials = None  # list of (trial, start, stop), built when needed
+        self._cards = None  # card id -> array of record indices, built when needed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._map:
+            self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        return self._event(self._record(index))
+
+    def query(self, trial=None, card=None, days=None):
+        """Return a list of the `Event`s for the given `trial` number, `card`
+        name and/or `days`, an inclusive `(first, last)` range.
+        """
+
+        card_id = self.card_ids.get(card, NONE) if card is not None else None
+
+        events = []
+        for index in self._candidates(trial, card_id, days):
+            record = self._record(index)
+
+            if trial is not None and record[0] != trial:
+                continue
+            if days is not None and not days[0] <= record[1] <= days[1]:
+                continue
+            if card_id is not None and record[3] != card_id:
+                continue
+
+            events.append(self._event(record))
+        return events
+
+    def array(self, trial=None, card=None, days=None):
+        """Like `query()`, but return a NumPy structured array of the raw
+        records (with ids rather than names), viewing the mapped file where
+        possible. Requires NumPy.
+        """
+
+        if numpy is None:
+            raise ImportError("NumPy is required to read events as an array")
+
+        dtype = numpy.dtype({
+            'names': ['trial', 'day', 'kind', 'card', 'source', 'target', 'value'],
+            'formats': ['<u4', '<u4', 'u1', '<u4', '<u4', '<u4', '<i4'],
+            'offsets': [0, 4, 8, 12, 16, 20, 24],
+            'itemsize': RECORD.size,
+        })
+
+        card_id = self.card_ids.get(card, NONE) if card is not None else None
+        records = numpy.frombuffer(self._map, dtype=dtype, count=self._count)
+
+        candidates = self._candidates(trial, card_id, days)
+        if isinstance(candidates, range):
+            records = records[candidates.start:candidates.stop]
+        else:
+            records = records[numpy.asarray(candidates, dtype=numpy.intp)]
+
+        mask = None
+        if days is not None:
+            mask = (records['day'] >= days[0]) & (records['day'] <= days[1])
+        if card_id is not None:
+            is_card = records['card'] == card_id
+            mask = is_card if mask is None else mask & is_card
+
+        return records if mask is None else records[mask]
+
+    def _record(self, index):
+        return RECORD.unpack_from(self._map, index * RECORD.size)
+
+    def _event(self, record):
+        trial, day, kind, card, source, target, value = record
+        return Event(
+            trial=trial,
+            day=day,
+            kind=KIND_NAMES[kind],
+            card=self.card_names[card],
+            source=self.location_names.get(source),
+            target=self.location_names.get(target),
+            value=value,
+        )
+
+    def _candidates(self, trial, card_id, days):
+        """Return the indices of the records that may match, in order: a
+        `range` if they are contiguous, or else a list
+        """
+
+        if trial is not None:
+            ranges = [self._range(trial, days)]
+        elif days is not None:
+            ranges = [self._range(t, days, start, stop) for t, start, stop in self._trial_ranges()]
+        else:
+            ranges = [(0, self._count,)]
+
+        if card_id is not None:
+            indices = self._card_index().get(card_id, ())
+            if trial is None and days is None:
+                return list(indices)
+            return [
+                index for start, stop in ranges
+                for index in indices[bisect.bisect_left(indices, start):bisect.bisect_left(indices, stop)]
+            ]
+
+        if len(ranges) == 1:
+            return range(*ranges[0])
+        return [index for start, stop in ranges for index in range(start, stop)]
+
+    def _range(self, trial, days, lo=0, hi=None):
+        """Return the (start, stop) range of records for `trial` that may
+        match, looking between `lo` and `hi` and relying on records being in
+        trial and day order.
+        """
+
+        keys = _Keys(self)
+        if hi is None:
+            hi = self._count
+
+        if days is None:
+            return bisect.bisect_left(keys, (trial,), lo, hi), bisect.bisect_left(keys, (trial + 1,), lo, hi)
+
+        return (
+            bisect.bisect_left(keys, (trial, days[0]), lo, hi),
+            bisect.bisect_left(keys, (trial, days[1] + 1), lo, hi),
+        )
+
+    def _trial_ranges(self):
+        """Return a list of the (trial, start, stop) range of records of
+        each trial, found by binary search
+        """
+
+        if self._trials is None:
+            self._trials = []
+            keys = _Keys(self)
+
+            start = 0
+            while start < self._count:
+                trial = self._record(start)[0]
+                stop = bisect.bisect_left(keys, (trial + 1,), start)
+                self._trials.append((trial, start, stop,))
+                start = stop
+
+        return self._trials
+
+    def _card_index(self):
+        """Return a dict of card id -> array of the indices of the card's
+        records, reading the whole log the first time
+        """
+
+        if self._cards is None:
+            self._cards = collections.defaultdict(lambda: array.array('l'))
+            records = memoryview(self._map)[:self._count * RECORD.size] if self._count else b""
+            for index, record in enumerate(RECORD.iter_unpack(records)):
+                self._cards[record[3]].append(index)
+            self._cards = dict(self._cards)
+
+        return self._cards
+
+
+class _Keys(object):
+    """A sequence of the (trial, day) of each record, for bisecting
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, index):
+        return self.reader._record(index)[:2]
@@ -0,0 +1,285 @@
+"""Opt-in instrumentation of a board, to see where simulation time goes.
+
+`enable()` (or `Board.instrument()`) switches every container on a board to
+an instrumented subclass of its own class, which counts and times calls to
+`pull()`, `next_card()` and `tick()`, lane clones and epic splits before
+passing them on. `disable()` (or `Board.uninstrument()`) switches them
+back. The simulator's own classes are never changed, so boards that are
+not instrumented run exactly as fast as before.
+
+Copies of an instrumented board, including those made by `clone()` and
+`BoardTemplate` for Monte Carlo trials, are instrumented too and add to
+the same `Stats`::
+
+    stats = board.instrument()
+    board.run_monte_carlo_simulation(trials=100, summary=True)
+    print stats.report()
+
+Stats are only collected in this process, so instrumented boards can't be
+run with `processes` other than 1 or on a `Coordinator`'s workers.
+"""
+
+import collections
+import timeit
+
+import kanban_simulator.board as kb
+
+clock = timeit.default_timer
+
+
+class Stats(object):
+    """Counters and timings collected from an instrumented board:
+
+    pulls:         Counter of `pull()` calls, by container
+    pulled:        Counter of cards pulled, by container
+    hits:          Counter of `next_card()` calls that returned a card
+    misses:        Counter of `next_card()` calls that returned None
+    cards_ticked:  number of times a card was ticked
+    clones:        number of boards cloned or built from a template
+    lane_clones:   number of lanes cloned (e.g. to make sub-lanes)
+    splits:        number of epics split
+    stories:       number of stories created by splits
+    times:         dict of seconds spent in the board's 'pull' and 'tick'
+                   phases, and in 'lane_clone'
+
+    Containers are named by `location_path()`. Epics are not instrumented,
+    so cards taken from an epic by a sub-lane only count towards the pulls
+    of the sub-lane's first column.
+
+    If given, `callback` is called as `callback(event, container, value)`
+    for each event counted: 'pull' (value: cards pulled), 'next_card'
+    (value: the card or None), 'tick' (value: cards ticked), 'clone' and
+    'lane_clone' (value: the copy; for boards built from a template, the
+    container is the template) and 'split' (value: number of stories).
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+
+        self.pulls = collections.Counter()
+        self.pulled = collections.Counter()
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self.cards_ticked = 0
+        self.clones = 0
+        self.lane_clones = 0
+        self.splits = 0
+        self.stories = 0
+        self.times = collections.Counter()
+
+    def report(self):
+        """Return a plain text summary of the stats
+        """
+
+        lines = [
+            "Pull phase:  %.3fs" % self.times['pull'],
+            "Tick phase:  %.3fs (%d cards ticked)" % (self.times['tick'], self.cards_ticked,),
+            "Clones:      %d boards, %d lanes (%.3fs)" % (self.clones, self.lane_clones, self.times['lane_clone'],),
+            "Splits:      %d epics into %d stories" % (self.splits, self.stories,),
+            "",
+            "%-40s %10s %10s %10s %10s" % ("Container", "Pulls", "Pulled", "Hits", "Misses",),
+        ]
+
+        names = set(self.pulls) | set(self.hits) | set(self.misses)
+        for name in sorted(names):
+            lines.append("%-40s %10d %10d %10d %10d" % (
+                name, self.pulls[name], self.pulled[name], self.hits[name], self.misses[name],
+            ))
+
+        return "\n".join(lines)
+
+
+def enable(board, callback=None):
+    """Instrument `board` and return a new `Stats` that it will add to
+    """
+
+    stats = Stats(callback)
+    classes = {}
+
+    def switch(container):
+        cls = kb.base_class(container)
+        if cls not in classes:
+            classes[cls] = _instrumented_class(cls, stats, switch)
+        container.__class__ = classes[cls]
+
+    for container in _containers(board):
+        switch(container)
+
+    return stats
+
+
+def is_instrumented(obj):
+    """Return True if `obj`, a board or other container, or a template
+    compiled from a board, is instrumented
+    """
+
+    return '_uninstrumented' in type(obj).__dict__
+
+
+def disable(board):
+    """Remove instrumentation from `board`
+    """
+
+    for container in _containers(board):
+        container.__class__ = kb.base_class(container)
+
+
+def _containers(board):
+    """Yield every board, lane, column, backlog and donelog that can be
+    reached from `board`.
+    """
+
+    seen = set()
+
+    def visit(obj):
+        if obj is None or id(obj) in seen:
+            return
+        seen.add(id(obj))
+
+        yield obj
+
+        if isinstance(obj, kb.Board):
+            for item in visit(obj.backlog):
+                yield item
+            for item in visit(obj.donelog):
+                yield item
+            for item in visit(obj.donelog.card_source):
+                yield item
+            for lane in obj.lanes:
+                for item in visit(lane):
+                    yield item
+
+        elif isinstance(obj, kb.Lane):
+            for item in visit(obj.backlog):
+                yield item
+            for item in visit(obj.donelog):
+                yield item
+            for column in obj.columns:
+                for item in visit(column):
+                    yield item
+
+        elif isinstance(obj, kb.SharedWIPColumn):
+            for column in obj.columns:
+                for item in visit(column):
+                    yield item
+
+        elif isinstance(obj, kb.SublaneColumn):
+            for lane in [obj.lane_template] + obj.lanes + obj._pool:
+                for item in visit(lane):
+                    yield item
+
+    return visit(board)
+
+
+def _name(container):
+    if isinstance(container, kb.AggregateCardSource):
+        return "(lane donelogs)"
+    return kb.location_path(container)
+
+
+def _instrumented_class(cls, stats, switch):
+    """Return a subclass of `cls` that records calls in `stats`. New
+    containers it creates are instrumented by calling `switch`.
+    """
+
+    namespace = {'_uninstrumented': cls}
+
+    if issubclass(cls, kb.Board):
+
+        def pull(self, check=None):
+            start = clock()
+            pulled = cls.pull(self, check)
+            stats.times['pull'] += clock() - start
+            return pulled
+
+        def tick(self, date, days=1):
+            start = clock()
+            cls.tick(self, date, days)
+            stats.times['tick'] += clock() - start
+
+        def clone(self):
+            board = cls.clone(self)
+            stats.clones += 1
+            if stats.callback is not None:
+                stats.callback('clone', self, board)
+            return board
+
+        def compile(self):
+            template = cls.compile(self)
+            switch(template)
+            return template
+
+        def _split(self, epic, stories):
+            cls._split(self, epic, stories)
+            stats.splits += 1
+            stats.stories += len(stories)
+            if stats.callback is not None:
+                stats.callback('split', epic, len(stories))
+
+        namespace.update(pull=pull, tick=tick, clone=clone, compile=compile, _split=_split)
+
+    elif issubclass(cls, kb.BoardTemplate):
+
+        def instantiate(self):
+            board = cls.instantiate(self)
+            stats.clones += 1
+            if stats.callback is not None:
+                stats.callback('clone', self, board)
+            return board
+
+        namespace.update(instantiate=instantiate, clone=instantiate)
+
+    elif issubclass(cls, kb.Lane):
+
+        def clone(self, name=None, backlog=None):
+            start = clock()
+            lane = cls.clone(self, name, backlog)
+            switch(lane.donelog)
+            stats.times['lane_clone'] += clock() - start
+            stats.lane_clones += 1
+            if stats.callback is not None:
+                stats.callback('lane_clone', self, lane)
+            return lane
+
+        namespace.update(clone=clone)
+
+    else:
+        if issubclass(cls, kb.PullCapable):
+
+            def pull(self, check=None):
+                pulled = cls.pull(self, check)
+                name = _name(self)
+                stats.pulls[name] += 1
+                stats.pulled[name] += pulled
+                if stats.callback is not None:
+                    stats.callback('pull', self, pulled)
+                return pulled
+
+            namespace.update(pull=pull)
+
+        if issubclass(cls, kb.CardSource):
+
+            def next_card(self, card_type=None):
+                card = cls.next_card(self, card_type)
+                if card is None:
+                    stats.misses[_name(self)] += 1
+                else:
+                    stats.hits[_name(self)] += 1
+                if stats.callback is not None:
+                    stats.callback('next_card', self, card)
+                return card
+
+            namespace.update(next_card=next_card)
+
+        if issubclass(cls, kb.Column) and not issubclass(cls, kb.SharedWIPColumn):
+
+            def tick(self, date, days=1):
+                cls.tick(self, date, days)
+                ticked = len(self.cards) * days
+                stats.cards_ticked += ticked
+                if stats.callback is not None:
+                    stats.callback('tick', self, ticked)
+
+            namespace.update(tick=tick)
+
+    return type(cls.__name__, (cls,), namespace)
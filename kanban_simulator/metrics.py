@@ -0,0 +1,328 @@
+"""Flow metrics collected as cards move, without walking the board each day.
+
+Each collector is a `BoardListener` that records only the moves it is told
+about, in compact integer arrays, and works out daily figures from them on
+demand. Collecting costs time in proportion to the number of moves, not to
+the size of the board times the number of days.
+
+Add collectors to a single board, or pass them to
+`run_monte_carlo_simulation()` to collect one set of figures per trial::
+
+    flow = FlowCollector()
+    throughput = ThroughputCollector()
+    board.run_monte_carlo_simulation(trials=100, summary=True, listeners=[flow, throughput])
+
+    cfd = flow.trials[0].cfd()
+    print throughput.mean()
+
+Locations are named by `location_path()`, so the sub-lanes of a sublane
+column are counted together, e.g. as "Team 1/Build/Build/Analysis".
+"""
+
+import abc
+import array
+import collections
+
+from kanban_simulator.board import ABC, BoardListener, Donelog, location_path
+
+
+def _daily(days, length):
+    """Return a list of how many of `days` fall on each day from 1 to
+    `length`
+    """
+
+    counts = [0] * length
+    for day in days:
+        if 0 < day <= length:
+            counts[day - 1] += 1
+    return counts
+
+
+def _cumulative(counts):
+    total = 0
+    result = []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+
+def _mean(rows, fill=None):
+    """Return the mean of each column of `rows`, padding short rows with
+    `fill`, or with their last value (or zero if empty) if `fill` is None
+    """
+
+    length = max([len(row) for row in rows] or [0])
+    totals = [0] * length
+    for row in rows:
+        pad = fill if fill is not None else (row[-1] if row else 0)
+        for i in range(length):
+            totals[i] += row[i] if i < len(row) else pad
+    return [total / float(len(rows)) for total in totals]
+
+
+class Collector(BoardListener, ABC):
+    """Base class for collectors, which keep one result per trial in
+    `trials`. Subclasses implement `new_trial()` to create the result for a
+    new trial, and the `BoardListener` methods to fill it in.
+
+    When used on a single board rather than in a Monte Carlo simulation,
+    a trial is started when the first event arrives.
+    """
+
+    def __init__(self):
+        self.trials = []
+        self.trial = None
+
+    @abc.abstractmethod
+    def new_trial(self):
+        """Return the result object for a new trial
+        """
+
+    def start_trial(self, trial, seed):
+        self.trial = self.new_trial()
+        self.trials.append(self.trial)
+
+    def ticked(self, board, date, days=1):
+        if self.trial is None:
+            self.start_trial(len(self.trials), None)
+        self.trial.days = date
+
+
+#
+# Cumulative flow and WIP
+#
+
+class FlowTrial(object):
+    """The flow through each location in one trial:
+
+    days:       number of days simulated
+    locations:  list of location names, in the order cards first arrived
+    arrivals:   dict of location name -> array of the day each card arrived
+    departures: dict of location name -> array of the day each card left
+    """
+
+    def __init__(self):
+        self.days = 0
+        self.locations = []
+        self.arrivals = {}
+        self.departures = {}
+
+    def add_location(self, name):
+        if name not in self.arrivals:
+            self.locations.append(name)
+            self.arrivals[name] = array.array('l')
+            self.departures[name] = array.array('l')
+
+    def daily_arrivals(self, location):
+        """Return a list of the number of cards arriving at `location` on
+        each day
+        """
+        return _daily(self.arrivals[location], self.days)
+
+    def daily_departures(self, location):
+        """Return a list of the number of cards leaving `location` on each
+        day
+        """
+        return _daily(self.departures[location], self.days)
+
+    def wip(self, location):
+        """Return a list of the number of cards in `location` at the end of
+        each day. Cards in a sub-lane's donelog are still counted after the
+        sub-lane is reused.
+        """
+        return _cumulative([
+            a - d for a, d in zip(self.daily_arrivals(location), self.daily_departures(location))
+        ])
+
+    def cfd(self):
+        """Return an OrderedDict of location name -> list of the number of
+        cards that had arrived there by the end of each day, for plotting a
+        cumulative flow diagram
+        """
+        return collections.OrderedDict(
+            (location, _cumulative(self.daily_arrivals(location)),)
+            for location in self.locations
+        )
+
+
+class FlowCollector(Collector):
+    """Records cards arriving at and leaving each location, to give the
+    WIP of each location by day and a cumulative flow diagram.
+    """
+
+    def __init__(self):
+        super(FlowCollector, self).__init__()
+        self._names = {}  # location -> name, for the current trial
+
+    def new_trial(self):
+        self._names = {}
+        return FlowTrial()
+
+    def card_moved(self, board, card, source, target):
+        if self.trial is None:
+            self.start_trial(len(self.trials), None)
+
+        if source is not None:
+            self.trial.departures[self._name(source)].append(board.day)
+
+        self.trial.arrivals[self._name(target)].append(board.day)
+
+    def mean_wip(self, location):
+        """Return the mean WIP of `location` on each day across all trials.
+        Trials that finished early count as having the WIP they ended with.
+        """
+        return _mean([
+            trial.wip(location) if location in trial.arrivals else []
+            for trial in self.trials
+        ])
+
+    def _name(self, location):
+        name = self._names.get(location)
+        if name is None:
+            name = self._names[location] = location_path(location)
+            self.trial.add_location(name)
+        return name
+
+
+#
+# Throughput
+#
+
+class ThroughputTrial(object):
+    """The cards finished in one trial:
+
+    days:     number of days simulated
+    finishes: array of the day each card reached the board's donelog
+    """
+
+    def __init__(self):
+        self.days = 0
+        self.finishes = array.array('l')
+
+    def daily(self):
+        """Return a list of the number of cards finished on each day
+        """
+        return _daily(self.finishes, self.days)
+
+
+class ThroughputCollector(Collector):
+    """Records the day each card reached the board's donelog
+    """
+
+    def new_trial(self):
+        return ThroughputTrial()
+
+    def card_moved(self, board, card, source, target):
+        if target is board.donelog:
+            if self.trial is None:
+                self.start_trial(len(self.trials), None)
+            self.trial.finishes.append(board.day)
+
+    def mean(self):
+        """Return the mean number of cards finished on each day across all
+        trials. Trials that finished early count as finishing nothing more.
+        """
+        return _mean([trial.daily() for trial in self.trials], fill=0)
+
+
+#
+# Aging WIP
+#
+
+class AgingTrial(object):
+    """When each card started and finished in one trial:
+
+    days:     number of days simulated
+    names:    list of card names
+    starts:   array of the day each card arrived on the board
+    finishes: array of the day each card first reached a donelog, or 0
+    """
+
+    def __init__(self):
+        self.days = 0
+        self.names = []
+        self.starts = array.array('l')
+        self.finishes = array.array('l')
+
+    def ages(self, day):
+        """Return a dict of card name -> age in days, for the cards that were
+        in progress at the end of `day`
+        """
+        return dict(
+            (name, day - start + 1,)
+            for name, start, finish in zip(self.names, self.starts, self.finishes)
+            if start <= day and (finish == 0 or finish > day)
+        )
+
+    def wip(self):
+        """Return a list of the number of cards in progress at the end of
+        each day
+        """
+        return _cumulative([
+            s - f for s, f in zip(_daily(self.starts, self.days), _daily(self.finishes, self.days))
+        ])
+
+    def mean_age(self):
+        """Return a list of the mean age of the cards in progress at the end
+        of each day, or 0 on days when there were none
+        """
+
+        started = _daily(self.starts, self.days)
+        finished = _daily(self.finishes, self.days)
+
+        # The total age of the cards in progress at the end of a day is the
+        # number of them times the day after, less the sum of their start days
+        started_sum = [0] * self.days
+        finished_sum = [0] * self.days
+        for start, finish in zip(self.starts, self.finishes):
+            if 0 < start <= self.days:
+                started_sum[start - 1] += start
+            if 0 < finish <= self.days:
+                finished_sum[finish - 1] += start
+
+        result = []
+        wip = start_sum = 0
+        for day in range(self.days):
+            wip += started[day] - finished[day]
+            start_sum += started_sum[day] - finished_sum[day]
+            result.append((wip * (day + 2) - start_sum) / float(wip) if wip else 0)
+        return result
+
+
+class AgingCollector(Collector):
+    """Records the days each card started and finished, to give the age of
+    the cards in progress on any day. A card starts when it arrives on the
+    board and finishes when it first reaches a donelog, so the stories of
+    an epic finish when they leave their sub-lane.
+
+    If `card_type` is given, only cards of that type are recorded.
+    """
+
+    def __init__(self, card_type=None):
+        super(AgingCollector, self).__init__()
+        self.card_type = card_type
+        self._index = {}  # card -> index, for the current trial
+
+    def new_trial(self):
+        self._index = {}
+        return AgingTrial()
+
+    def card_moved(self, board, card, source, target):
+        if self.card_type is not None and not isinstance(card, self.card_type):
+            return
+
+        if self.trial is None:
+            self.start_trial(len(self.trials), None)
+
+        trial = self.trial
+        index = self._index.get(card)
+
+        if index is None:
+            index = self._index[card] = len(trial.names)
+            trial.names.append(card.name)
+            trial.starts.append(board.day)
+            trial.finishes.append(0)
+
+        if isinstance(target, Donelog) and trial.finishes[index] == 0:
+            trial.finishes[index] = board.day
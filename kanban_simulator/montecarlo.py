@@ -0,0 +1,389 @@
+"""Helpers for running Monte Carlo trials, optionally across several
+processes.
+
+Each trial is run with its own random seed, derived from a master seed, so
+that a set of trials can be reproduced regardless of how many processes
+were used to run them.
+"""
+
+import math
+import bisect
+import pickle
+import random
+import itertools
+import collections
+import multiprocessing
+
+try:
+    import cloudpickle
+except ImportError:
+    cloudpickle = None
+
+from kanban_simulator import distributions
+
+
+class TrialSummary(collections.namedtuple('TrialSummary', ['day', 'trial', 'seed', 'cards', 'touch', 'age'])):
+    """A compact record of one Monte Carlo trial:
+
+    day:   the day on which the board was empty
+    trial: the index of the trial in the run
+    seed:  the seed used for the trial, which can be passed to
+           `Board.replay_trial()` to rebuild the full board
+    cards: the number of cards in the board's donelog
+    touch: the total touch time of those cards
+    age:   the total age of those cards
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_board(cls, trial, seed, day, board):
+        stats = board.donelog.stats
+        return cls(
+            day=day,
+            trial=trial,
+            seed=seed,
+            cards=stats.count,
+            touch=stats.touch,
+            age=stats.age,
+        )
+
+
+def percentile(results, q):
+    """Return the entry at percentile `q` (e.g. 0.85) from a sorted list of
+    Monte Carlo results, as returned by `Board.run_monte_carlo_simulation()`.
+    """
+
+    return results[min(int(len(results) * q), len(results) - 1)]
+
+
+def trial_seeds(seed, trials):
+    """Return a list of `trials` per-trial seeds derived from the master
+    `seed`.
+
+    If `seed` is None, the master seed is drawn from the global random
+    number generator, so `random.seed()` can still be used to make a run
+    reproducible.
+    """
+
+    return list(itertools.islice(iter_seeds(seed), trials))
+
+
+def iter_seeds(seed):
+    """Yield per-trial seeds derived from the master `seed` without end.
+    The first `n` are the same as `trial_seeds(seed, n)`.
+    """
+
+    if seed is None:
+        seed = random.getrandbits(32)
+
+    rng = random.Random(seed)
+    while True:
+        yield rng.getrandbits(32)
+
+
+def run_trial(board, seed, max_days=100000, engine='tick', listeners=()):
+    """Run a single trial on a clone of `board`, seeding the global random
+    number generator (used by `touch` and `splits` callables) and any
+    distributions with their own generator first. `board` may also be a
+    `BoardTemplate`, which clones much faster. `listeners` are added to the
+    clone.
+
+    Returns a `(day, board)` tuple.
+    """
+
+    random.seed(seed)
+
+    trial_board = board.clone()
+    distributions.reseed(trial_board, seed)
+    trial_board.listeners.extend(listeners)
+
+    return trial_board.run_simulation(max_days=max_days, engine=engine)
+
+
+def require_local(board):
+    """Raise a `ValueError` if `board` (or template) can't be run in other
+    processes because it is instrumented: its stats would be collected
+    there and lost.
+    """
+
+    from kanban_simulator import instrument
+    if instrument.is_instrumented(board):
+        raise ValueError("Instrumented boards can only be run in one process")
+
+
+def dumps(obj):
+    """Serialise `obj` so that it can be sent to another process.
+
+    Boards typically hold lambdas (for `touch` and `splits`), which the
+    standard `pickle` module can't handle. If `cloudpickle` is installed,
+    it is used instead.
+    """
+
+    try:
+        if cloudpickle is not None:
+            return cloudpickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        raise TypeError(
+            "Unable to serialise %r for another process (%s). Install "
+            "`cloudpickle`, or use module-level functions or distributions "
+            "rather than lambdas for `touch` and `splits`." % (obj, e,)
+        )
+
+
+def loads(data):
+    return pickle.loads(data)
+
+
+def run_summary_trial(board, trial, seed, max_days=100000, engine='tick', listeners=()):
+    """Run a single trial like `run_trial()`, but return only a
+    `TrialSummary`, allowing the board to be discarded.
+    """
+
+    day, result = run_trial(board, seed, max_days, engine, listeners)
+    return TrialSummary.from_board(trial, seed, day, result)
+
+
+def run_trials(board, seeds, max_days=100000, processes=1, summary=False, engine='tick', listeners=(), first_trial=0):
+    """Run one trial per seed in `seeds` and return a list of `(day, board)`
+    tuples, or `TrialSummary` records if `summary` is True, in the same order
+    as `seeds`. Trials are numbered from `first_trial`.
+
+    If `processes` is 1, trials are run in this process. Otherwise, a
+    process pool of that size (or one process per CPU, if None) is used.
+
+    The board is compiled into a `BoardTemplate` once, and each trial is run
+    on a copy built from it. `listeners` are told when each trial starts and
+    added to its board; they can't be used with other processes.
+    """
+
+    board = board.compile()
+
+    if processes == 1:
+        results = []
+        state = random.getstate()
+        try:
+            for trial, seed in enumerate(seeds, first_trial):
+                for listener in listeners:
+                    listener.start_trial(trial, seed)
+
+                if summary:
+                    results.append(run_summary_trial(board, trial, seed, max_days, engine, listeners))
+                else:
+                    results.append(run_trial(board, seed, max_days, engine, listeners))
+            return results
+        finally:
+            random.setstate(state)
+
+    if listeners:
+        raise ValueError("Listeners can only be used when running trials in one process")
+    require_local(board)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    chunksize = max(1, len(seeds) // (processes * 4))
+    pool = multiprocessing.Pool(processes, _init_worker, (dumps([board]), max_days, summary, engine,))
+    tasks = ((0, trial, seed) for trial, seed in enumerate(seeds, first_trial))
+
+    try:
+        return [loads(r) for r in pool.imap(_run_worker_trial, tasks, chunksize)]
+    finally:
+        pool.close()
+        pool.join()
+
+
+def iter_trials(board, seed=None, max_days=100000, processes=1, engine='tick', batch_size=100):
+    """Yield a `TrialSummary` for each trial of `board` as it completes, in
+    trial order, without end. Trials are seeded as for `run_trials()`.
+
+    If `processes` is not 1, trials are handed to a process pool
+    `batch_size` trials at a time, so that at most one batch is run that
+    is not needed when the caller stops early.
+    """
+
+    seeds = iter_seeds(seed)
+    template = board.compile()
+
+    if processes == 1:
+        for trial, trial_seed in enumerate(seeds):
+            state = random.getstate()
+            try:
+                result = run_summary_trial(template, trial, trial_seed, max_days, engine)
+            finally:
+                random.setstate(state)
+            yield result
+        return
+
+    require_local(template)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    chunksize = max(1, batch_size // (processes * 4))
+    pool = multiprocessing.Pool(processes, _init_worker, (dumps([template]), max_days, True, engine,))
+
+    try:
+        trials = ((0, trial, trial_seed) for trial, trial_seed in enumerate(seeds))
+        while True:
+            batch = list(itertools.islice(trials, batch_size))
+            for result in pool.imap(_run_worker_trial, batch, chunksize):
+                yield loads(result)
+    finally:
+        pool.close()
+        pool.join()
+
+
+Estimate = collections.namedtuple('Estimate', ['trials', 'mean', 'quantiles', 'intervals', 'converged'])
+Estimate.__doc__ = """A running estimate of the finish day from a streaming Monte Carlo run:
+
+trials:    the number of trials so far
+mean:      the mean finish day
+quantiles: dict of finish day by quantile (e.g. 0.85)
+intervals: dict of (low, high) confidence interval for each quantile
+converged: True if every interval is within the requested tolerance
+"""
+
+
+def iter_estimates(board, quantiles=(0.5, 0.85, 0.95,), tolerance=None, confidence=0.95,
+                   min_trials=100, max_trials=None, seed=None, max_days=100000, processes=1, engine='tick'):
+    """Run trials of `board` and yield an `Estimate` after each one.
+
+    Stops once `max_trials` trials have run, or, if `tolerance` is given and
+    at least `min_trials` have run, once the confidence interval of every
+    quantile lies within `tolerance` days of the estimate. With neither,
+    runs forever.
+
+    Finish days are kept in a `DaySketch`, so memory use does not grow
+    with the number of trials.
+    """
+
+    sketch = DaySketch()
+    z = normal_quantile(0.5 + confidence / 2.0)
+
+    for result in iter_trials(board, seed, max_days, processes, engine):
+        sketch.add(result.day)
+
+        estimates = dict((q, sketch.quantile(q)) for q in quantiles)
+        intervals = dict((q, sketch.interval(q, z)) for q in quantiles)
+
+        converged = tolerance is not None and sketch.count >= min_trials and all(
+            estimates[q] - intervals[q][0] <= tolerance and intervals[q][1] - estimates[q] <= tolerance
+            for q in quantiles
+        )
+
+        yield Estimate(sketch.count, sketch.mean, estimates, intervals, converged)
+
+        if converged or (max_trials is not None and sketch.count >= max_trials):
+            break
+
+
+class DaySketch(object):
+    """Counts of whole-day finishes, from which the mean and quantiles can
+    be read.
+
+    Memory use depends only on the number of distinct days seen (at most
+    the `max_days` of the simulation), not on the number of finishes.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.days = []  # distinct days, sorted
+        self.count = 0
+        self.total = 0
+
+    def add(self, day):
+        if day not in self.counts:
+            bisect.insort(self.days, day)
+            self.counts[day] = 0
+
+        self.counts[day] += 1
+        self.count += 1
+        self.total += day
+
+    @property
+    def mean(self):
+        return float(self.total) / self.count if self.count else None
+
+    def at_rank(self, rank):
+        """Return the day at position `rank` (from 0) if all days were
+        listed in order.
+        """
+
+        seen = 0
+        for day in self.days:
+            seen += self.counts[day]
+            if rank < seen:
+                return day
+        return None
+
+    def quantile(self, q):
+        """Return the day at quantile `q`, consistent with `percentile()`
+        """
+
+        if not self.count:
+            return None
+        return self.at_rank(min(int(self.count * q), self.count - 1))
+
+    def interval(self, q, z=1.96):
+        """Return a (low, high) confidence interval for the day at quantile
+        `q`, using the normal approximation to the binomial distribution of
+        the number of finishes below it. `z` sets the confidence level.
+        """
+
+        if not self.count:
+            return (None, None,)
+
+        n = self.count
+        spread = z * math.sqrt(n * q * (1 - q))
+        low = max(int(math.floor(n * q - spread)), 0)
+        high = min(int(math.ceil(n * q + spread)), n - 1)
+
+        return (self.at_rank(low), self.at_rank(high),)
+
+
+def normal_quantile(p):
+    """Return `x` such that a standard normal variable is below `x` with
+    probability `p`.
+    """
+
+    low, high = -10.0, 10.0
+    for _ in range(100):
+        mid = (low + high) / 2
+        if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < p:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+#
+# Worker process state
+#
+
+_worker_boards = None
+_worker_max_days = None
+_worker_summary = False
+_worker_engine = None
+
+
+def _init_worker(payload, max_days, summary, engine):
+    """Set up a pool worker. `payload` is a list of boards (or templates),
+    e.g. one per configuration of a sweep, serialised with `dumps()`.
+    """
+    global _worker_boards, _worker_max_days, _worker_summary, _worker_engine
+    _worker_boards = loads(payload)
+    _worker_max_days = max_days
+    _worker_summary = summary
+    _worker_engine = engine
+
+
+def _run_worker_trial(args):
+    """Run the trial given by `args`, a tuple of `(board index, trial
+    number, seed)`, in a pool worker
+    """
+    index, trial, seed = args
+    board = _worker_boards[index]
+    if _worker_summary:
+        return dumps(run_summary_trial(board, trial, seed, _worker_max_days, _worker_engine))
+    return dumps(run_trial(board, seed, _worker_max_days, _worker_engine))
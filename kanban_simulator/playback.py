@@ -0,0 +1,213 @@
+"""Record a simulation as a stream of per-day changes, and play it back.
+
+Rendering the whole board each day gets slower as the donelog grows. A
+`Recorder` instead listens to the board and keeps, for each day on which
+something happened, a `Frame` with just the cards that moved and the new
+card counts of the locations they moved between. A `Playback` applies
+frames one at a time to rebuild the board's contents, so the cost of
+playing back a run depends on the number of moves, not on the size of the
+board times the number of days::
+
+    board = board.clone()
+    recorder = Recorder(board)
+    board.run_simulation()
+
+    for day, playback in Playback(recorder.frames):
+        display(HTML(playback.frame_html()))
+
+Frames hold only names and numbers, so they can be saved with
+`dump_frames()` and read back with `load_frames()`.
+"""
+
+import json
+import collections
+
+from kanban_simulator.board import BoardListener, location_path
+
+
+class Frame(collections.namedtuple('Frame', ['day', 'moves', 'counts', 'locations'])):
+    """The changes to a board on one day:
+
+    day:       the day
+    moves:     list of `(card name, source id, target id)` tuples, in the
+               order the cards moved; the source id is None for cards that
+               were not on the board before
+    counts:    dict of location id -> number of cards there at the end of
+               the day, for the locations cards moved to or from
+    locations: dict of location id -> name, for locations first seen today
+    """
+
+    __slots__ = ()
+
+
+class Recorder(BoardListener):
+    """Listens to a board and records a `Frame` for each day on which a card
+    moved, in `frames`.
+
+    Locations are identified by number. Their names include the lanes they
+    are in, e.g. "Team 1/Discovery".
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.frames = []
+
+        self._ids = {}  # location -> id
+        self._counts = {}  # location id -> number of cards
+
+        self._moves = []
+        self._changed = set()
+        self._new = {}
+
+        board.listeners.append(self)
+
+    def detach(self):
+        """Stop recording
+        """
+        self.board.listeners.remove(self)
+
+    def card_moved(self, board, card, source, target):
+        source_id = self._id(source) if source is not None else None
+        target_id = self._id(target)
+
+        self._moves.append((card.name, source_id, target_id,))
+
+        if source_id is not None:
+            self._counts[source_id] -= 1
+            self._changed.add(source_id)
+
+        self._counts[target_id] += 1
+        self._changed.add(target_id)
+
+    def ticked(self, board, date, days=1):
+        if not self._moves:
+            return
+
+        self.frames.append(Frame(
+            day=date,
+            moves=self._moves,
+            counts=dict((i, self._counts[i]) for i in self._changed),
+            locations=self._new,
+        ))
+
+        self._moves = []
+        self._changed = set()
+        self._new = {}
+
+    def _id(self, location):
+        location_id = self._ids.get(location)
+        if location_id is None:
+            location_id = self._ids[location] = len(self._ids)
+            self._counts[location_id] = 0
+            self._new[location_id] = location_path(location)
+        return location_id
+
+
+class Playback(object):
+    """Replays frames recorded by a `Recorder`.
+
+    Iterating over the playback applies each frame in turn and yields a
+    `(day, playback)` tuple. `cards` then holds the names of the cards in
+    each location, `counts` the number of cards there, and `frame` the
+    frame just applied. Card names are assumed to be unique.
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+
+        self.frame = None
+        self.locations = collections.OrderedDict()  # id -> name
+        self.cards = {}  # location id -> OrderedDict of card names
+        self.counts = {}
+
+    def __iter__(self):
+        for frame in self.frames:
+            self.apply(frame)
+            yield (frame.day, self,)
+
+    def apply(self, frame):
+        """Apply the changes in `frame`
+        """
+
+        for location_id, name in sorted(frame.locations.items()):
+            self.locations[location_id] = name
+            self.cards[location_id] = collections.OrderedDict()
+
+        for name, source_id, target_id in frame.moves:
+            if source_id is not None:
+                del self.cards[source_id][name]
+            self.cards[target_id][name] = True
+
+        self.counts.update(frame.counts)
+        self.frame = frame
+
+    def frame_html(self):
+        """Render the moves in the current frame and the new counts of the
+        locations they affected
+        """
+
+        frame = self.frame
+
+        moves = "\n".join((
+            "<li>%s: %s &rarr; %s</li>" % (
+                name,
+                self.locations[source_id] if source_id is not None else "(new)",
+                self.locations[target_id],
+            ) for name, source_id, target_id in frame.moves
+        ))
+
+        counts = "\n".join((
+            "<tr><td>%s</td><td>%d</td></tr>" % (self.locations[i], frame.counts[i],)
+            for i in sorted(frame.counts)
+        ))
+
+        return """
+        <div class='kanban-frame'>
+            <div class='day'>Day %(day)d</div>
+            <ul class='moves'>%(moves)s</ul>
+            <table class='counts'>%(counts)s</table>
+        </div>
+        """ % {
+            'day': frame.day,
+            'moves': moves,
+            'counts': counts,
+        }
+
+    def to_html(self):
+        """Render the full contents of every location seen so far
+        """
+
+        return "<table class='kanban-playback'>%s</table>" % "\n".join((
+            "<tr><th>%s</th><td>%s</td></tr>" % (
+                name,
+                "\n".join(("<div class='card'>%s</div>" % c for c in self.cards[i])),
+            ) for i, name in self.locations.items()
+        ))
+
+
+def dump_frames(frames, fp):
+    """Write frames to the file `fp`, one JSON object per line
+    """
+
+    for frame in frames:
+        fp.write(json.dumps({
+            'day': frame.day,
+            'moves': frame.moves,
+            'counts': sorted(frame.counts.items()),
+            'locations': sorted(frame.locations.items()),
+        }))
+        fp.write("\n")
+
+
+def load_frames(fp):
+    """Read frames written by `dump_frames()` from the file `fp`
+    """
+
+    for line in fp:
+        data = json.loads(line)
+        yield Frame(
+            day=data['day'],
+            moves=[tuple(m) for m in data['moves']],
+            counts=dict(data['counts']),
+            locations=dict(data['locations']),
+        )
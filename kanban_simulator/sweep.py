@@ -0,0 +1,287 @@
+"""Run Monte Carlo simulations of variations of a board, to answer "what
+if" questions.
+
+A sweep takes a base board and a grid of overrides, and runs every
+combination of them with the same per-trial seeds, so that differences
+between configurations are not lost in the noise of different random
+draws::
+
+    rows = sweep(board, {
+        '*/Build.wip_limit': [1, 2],
+        'lanes': [2, 3],
+    }, trials=1000, seed=42, processes=None)
+
+    for row in summarise(rows):
+        print row
+
+Each override key is one of:
+
+`lanes`
+    the number of lanes; lanes are removed from the end, or added by cloning
+    the last lane
+`<path>.<attribute>`
+    sets `attribute` (e.g. `wip_limit` or `touch`) of every lane or column
+    whose path matches the pattern `path` and that has that attribute.
+    `touch` is only set on work columns, not on queues, sublane columns or
+    shared WIP columns.
+    Paths are like "Team 1/Build", and columns in the template lane of a
+    sublane column are like "Team 1/Build/Build/Analysis". Patterns may use
+    `*` and `?`, which do not match "/".
+`<card>.splits.<column>`
+    sets the number of stories (or callable) that epics whose name matches
+    the pattern `card` split into in the column named `column`
+
+An override that matches nothing in some configurations of a sweep, such as
+one for "Team 3" when `lanes` is 2, is left out of those configurations. One
+that matches nothing in any of them is an error.
+
+Results are tidy: one dict per trial, with the overrides applied, the index
+of the configuration as `config`, and the fields of a `TrialSummary`.
+"""
+
+import re
+import itertools
+import multiprocessing
+
+import kanban_simulator.board as kb
+from kanban_simulator import montecarlo
+
+
+def configurations(grid):
+    """Return a list of override dicts, one for each combination of the
+    values in `grid`, a dict of override key -> list of values. A list of
+    override dicts is returned as it is.
+    """
+
+    if not isinstance(grid, dict):
+        return list(grid)
+
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*[grid[k] for k in keys])]
+
+
+def configure(board, overrides):
+    """Return a copy of `board` with `overrides` applied. Raises
+    `ValueError` if an override matches nothing on the board.
+    """
+
+    board, unmatched = _configure(board, overrides)
+    if unmatched:
+        raise ValueError("Nothing matches %r" % unmatched[0])
+    return board
+
+
+def _configure(board, overrides):
+    """Return a copy of `board` with those of `overrides` that match
+    something applied, and a list of the keys of those that don't
+    """
+
+    board = board.clone()
+    unmatched = []
+
+    if 'lanes' in overrides:
+        board = _with_lanes(board, overrides['lanes'])
+
+    for key, value in sorted(overrides.items()):
+        if key == 'lanes':
+            continue
+
+        if '.splits.' in key:
+            pattern, column = key.split('.splits.', 1)
+            epics = [e for e in _epics(board.backlog) if _match(pattern, e.name)]
+            if not epics:
+                unmatched.append(key)
+            for epic in epics:
+                epic.splits = dict(epic.splits)
+                epic.splits[column] = value
+            continue
+
+        if '.' not in key:
+            raise ValueError("Unknown override %r" % key)
+
+        pattern, attribute = key.rsplit('.', 1)
+        targets = [t for path, t in _targets(board) if _match(pattern, path) and _accepts(t, attribute)]
+        if not targets:
+            unmatched.append(key)
+
+        for target in targets:
+            setattr(target, attribute, value)
+
+    return board, unmatched
+
+
+def sweep(board, grid, trials=100, seed=None, max_days=100000, processes=1, engine='tick'):
+    """Run `trials` Monte Carlo trials of each configuration of `board`
+    given by `grid` (see `configurations()`), and return a list of result
+    rows, one dict per trial.
+
+    Every configuration uses the same per-trial seeds, derived from `seed`
+    as for `Board.run_monte_carlo_simulation()`. If `processes` is not 1,
+    the trials of all configurations are spread over one process pool.
+
+    Raises `ValueError` before running any trials if an override matches
+    nothing in every configuration it is used in.
+    """
+
+    configs = configurations(grid)
+
+    boards = []
+    applied = []  # the overrides that matched something, for each configuration
+    used, matched = set(), set()
+    for overrides in configs:
+        config_board, unmatched = _configure(board, overrides)
+        boards.append(config_board)
+        applied.append(dict((k, v) for k, v in overrides.items() if k not in unmatched))
+        used.update(overrides)
+        matched.update(applied[-1])
+
+    if used - matched:
+        raise ValueError("Nothing matches %r in any configuration" % sorted(used - matched)[0])
+
+    seeds = montecarlo.trial_seeds(seed, trials)
+
+    if processes == 1:
+        results = []
+        for config_board in boards:
+            results.extend(montecarlo.run_trials(config_board, seeds, max_days=max_days, summary=True, engine=engine))
+    else:
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        templates = [b.compile() for b in boards]
+        for template in templates:
+            montecarlo.require_local(template)
+
+        tasks = [(c, trial, s) for c in range(len(templates)) for trial, s in enumerate(seeds)]
+        chunksize = max(1, len(tasks) // (processes * 4))
+        pool = multiprocessing.Pool(
+            processes, montecarlo._init_worker, (montecarlo.dumps(templates), max_days, True, engine,)
+        )
+
+        try:
+            results = [montecarlo.loads(r) for r in pool.imap(montecarlo._run_worker_trial, tasks, chunksize)]
+        finally:
+            pool.close()
+            pool.join()
+
+    rows = []
+    for index, result in enumerate(results):
+        config = index // trials
+        row = dict(applied[config])
+        row['config'] = config
+        row.update(result._asdict())
+        rows.append(row)
+
+    return rows
+
+
+def summarise(rows, quantiles=(0.5, 0.85, 0.95,)):
+    """Return one dict per configuration from the result rows of `sweep()`,
+    with the overrides, the number of `trials`, the `mean` finish day, and
+    the finish day at each of `quantiles`, e.g. as 'p85'.
+    """
+
+    days = {}
+    overrides = {}
+    for row in rows:
+        days.setdefault(row['config'], []).append(row['day'])
+        overrides[row['config']] = dict((k, v) for k, v in row.items() if k not in _RESULT_FIELDS)
+
+    summaries = []
+    for config in sorted(days):
+        finishes = sorted(days[config])
+        summary = overrides[config]
+        summary['trials'] = len(finishes)
+        summary['mean'] = sum(finishes) / float(len(finishes))
+        for q in quantiles:
+            summary['p%g' % (q * 100)] = montecarlo.percentile(finishes, q)
+        summaries.append(summary)
+
+    return summaries
+
+
+_RESULT_FIELDS = frozenset(montecarlo.TrialSummary._fields)
+
+
+def _with_lanes(board, count):
+    """Return a board like `board` with `count` lanes
+    """
+
+    lanes = board.lanes[:count]
+    while len(lanes) < count:
+        lane = lanes[-1].clone(name=_next_name(lanes[-1].name))
+        lane.donelog.name = lane.name + " Done"
+        lanes.append(lane)
+
+    # type(board) rather than kb.Board, to keep any instrumentation
+    return type(board)(board.name, lanes, board.backlog, retention=board.donelog.retention)
+
+
+def _accepts(target, attribute):
+    """Return True if `attribute` can be overridden on `target`: `touch`
+    only on work columns, not queues or columns made of others, and
+    `wip_limit` only on lanes and columns, which enforce it
+    """
+
+    if attribute == 'touch':
+        return isinstance(target, kb.Column) and not isinstance(
+            target, (kb.QueueColumn, kb.SublaneColumn, kb.SharedWIPColumn,))
+    if attribute == 'wip_limit':
+        return isinstance(target, (kb.Lane, kb.Column,))
+    return hasattr(target, attribute)
+
+
+def _match(pattern, name):
+    """Like `fnmatch.fnmatchcase()`, but wildcards do not match "/"
+    """
+
+    regex = "".join(
+        "[^/]*" if c == '*' else "[^/]" if c == '?' else re.escape(c)
+        for c in pattern
+    )
+    return re.match(regex + r"\Z", name) is not None
+
+
+def _next_name(name):
+    """Return "Team 3" for "Team 2", or "Team 2" for "Team"
+    """
+
+    match = re.match(r'^(.*?)(\d+)$', name)
+    if match is None:
+        return "%s 2" % name
+    return "%s%d" % (match.group(1), int(match.group(2)) + 1,)
+
+
+def _targets(board):
+    """Yield a `(path, object)` tuple for each lane and column on `board`
+    """
+
+    def lane_targets(lane, prefix):
+        path = prefix + lane.name
+        yield (path, lane,)
+        for column in lane.columns:
+            for target in column_targets(column, path + "/"):
+                yield target
+
+    def column_targets(column, prefix):
+        path = prefix + column.name
+        yield (path, column,)
+        if isinstance(column, kb.SharedWIPColumn):
+            for child in column.columns:
+                for target in column_targets(child, path + "/"):
+                    yield target
+        elif isinstance(column, kb.SublaneColumn):
+            for target in lane_targets(column.lane_template, path + "/"):
+                yield target
+
+    for lane in board.lanes:
+        for target in lane_targets(lane, ""):
+            yield target
+
+
+def _epics(source):
+    for card in source.cards:
+        if isinstance(card, kb.Epic):
+            yield card
+            for epic in _epics(card):
+                yield epic
@@ -22,10 +22,11 @@ setup(
     install_requires=[
     ],
 
-    # extras_require={
-    #     'dev': ['check-manifest'],
-    #     'test': ['coverage'],
-    # },
+    extras_require={
+        'parallel': ['cloudpickle'],
+        'batch': ['numpy'],
+        'yaml': ['PyYAML'],
+    },
 
     # entry_points={
     #     'console_scripts': [
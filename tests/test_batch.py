@@ -0,0 +1,45 @@
+import pytest
+
+import kanban_simulator.board as kb
+
+np = pytest.importorskip('numpy')
+batch = pytest.importorskip('kanban_simulator.batch')
+
+
+def make_board(touch):
+    """Two lanes of columns with WIP limits and a queue, all pulling from
+    the board's backlog
+    """
+
+    def lane(name):
+        return kb.Lane(name, wip_limit=4, columns=[
+            kb.Column("Analysis", touch=touch(1), wip_limit=2),
+            kb.QueueColumn("Ready", wip_limit=2),
+            kb.Column("Development", touch=touch(2), wip_limit=3),
+            kb.Column("Test", touch=touch(3), wip_limit=1),
+        ])
+
+    cards = [kb.Card("Card %d" % i) for i in range(25)]
+    return kb.Board("Batch", [lane("Team 1"), lane("Team 2")], kb.Backlog(cards=cards))
+
+
+def fixed(n):
+    return n
+
+
+def by_card(n):
+    return lambda card: (int(card.name.split()[1]) * n) % 4 + 1
+
+
+@pytest.mark.parametrize('touch', [fixed, by_card])
+def test_batch_matches_object_engine(touch):
+    board = make_board(touch)
+
+    day, done = board.clone().run_simulation()
+    ages = dict((card.name, card.age) for card in done.donelog.cards)
+
+    result = batch.BatchSimulator(board).run(trials=3, seed=1)
+
+    assert result.cards == [card.name for card in board.backlog.cards]
+    assert result.days.tolist() == [day] * 3
+    assert result.cycle_times.tolist() == [[ages[name] for name in result.cards]] * 3
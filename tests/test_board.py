@@ -0,0 +1,71 @@
+import pytest
+
+import kanban_simulator.board as kb
+
+
+def make_board(seed_after_wiring=False, touch=None):
+    development = kb.Column("Development", touch=2, wip_limit=2)
+    test = kb.Column("Test", touch=1, wip_limit=2)
+
+    in_progress = kb.Card("In progress")
+    if touch is not None:
+        in_progress.record_touch(development, touch)
+
+    if not seed_after_wiring:
+        development.cards.append(in_progress)
+
+    board = kb.Board(
+        name="Test",
+        lanes=[kb.Lane("Team 1", [development, test])],
+        backlog=kb.Backlog(cards=[kb.Card("Card %d" % i) for i in range(3)]),
+    )
+
+    if seed_after_wiring:
+        development.cards.append(in_progress)
+
+    return board, in_progress
+
+
+@pytest.mark.parametrize('engine', ['tick', 'event'])
+@pytest.mark.parametrize('seed_after_wiring', [False, True])
+def test_work_in_progress_added_to_column(engine, seed_after_wiring):
+    board, in_progress = make_board(seed_after_wiring)
+
+    day, board = board.run_simulation(engine=engine)
+
+    assert day == 6
+    assert [c.name for c in board.donelog.cards] == ["In progress", "Card 0", "Card 1", "Card 2"]
+    assert in_progress.location is board.donelog
+    assert board.lanes[0]._wip == 0
+    assert board.lanes[0]._load == 0
+
+
+@pytest.mark.parametrize('engine', ['tick', 'event'])
+def test_work_in_progress_keeps_recorded_touch(engine):
+    board, in_progress = make_board(touch=4)
+
+    day, board = board.run_simulation(engine=engine)
+
+    assert day == 8
+    assert in_progress.history[board.lanes[0].columns[0]]['age'] == 4
+
+
+def make_split_board(retention):
+    lane = kb.Lane("Team 1", [
+        kb.SublaneColumn("Build", kb.Lane("Build", [
+            kb.Column("Development", touch=1, wip_limit=2, card_type=kb.Story),
+        ]), wip_limit=1, card_type=kb.Epic),
+    ])
+    epic = kb.Epic("Epic", splits={'Build': 3})
+    return kb.Board("Test", [lane], kb.Backlog(cards=[epic]), retention=retention), epic
+
+
+@pytest.mark.parametrize('retention, stories', [('cards', 3), ('summary', 0), ('stats', 0)])
+def test_epic_keeps_stories_only_with_card_retention(retention, stories):
+    board, epic = make_split_board(retention)
+
+    for day, board in board:
+        pass
+
+    assert len(epic.stories) == stories
+    assert all(story.location is not None for story in epic.stories)
@@ -0,0 +1,84 @@
+import time
+
+from multiprocessing.connection import Client
+
+import kanban_simulator.board as kb
+from kanban_simulator import cluster, montecarlo
+from kanban_simulator.distributions import UniformInt
+
+AUTHKEY = b"test"
+
+
+def make_board():
+    return kb.Board(
+        name="Test",
+        lanes=[kb.Lane("Team 1", [
+            kb.Column("Analysis", touch=UniformInt(1, 3), wip_limit=2),
+            kb.Column("Development", touch=UniformInt(2, 5), wip_limit=2),
+        ])],
+        backlog=kb.Backlog(cards=[kb.Card("Card %d" % i) for i in range(6)]),
+    )
+
+
+def wait_for_workers(coordinator, count, timeout=30):
+    deadline = time.time() + timeout
+    while coordinator.workers < count:
+        assert time.time() < deadline, "workers did not connect"
+        time.sleep(0.05)
+
+
+def stop(workers):
+    # The coordinator tells its workers to stop when it closes
+    for worker in workers:
+        worker.join(5)
+        if worker.is_alive():
+            worker.terminate()
+
+
+def test_workers_match_serial_trials():
+    board = make_board()
+    seeds = montecarlo.trial_seeds(1, 50)
+
+    with cluster.Coordinator(authkey=AUTHKEY, chunk_size=7) as coordinator:
+        workers = cluster.start_workers(coordinator.address, AUTHKEY, processes=2)
+        results = coordinator.run_trials(board, seeds)
+    stop(workers)
+
+    assert results == montecarlo.run_trials(board, seeds, summary=True)
+
+
+def test_trials_of_a_killed_worker_are_run_by_another():
+    board = make_board()
+    seeds = montecarlo.trial_seeds(2, 50)
+
+    with cluster.Coordinator(authkey=AUTHKEY, chunk_size=7) as coordinator:
+        workers = cluster.start_workers(coordinator.address, AUTHKEY, processes=2)
+        wait_for_workers(coordinator, 2)
+        workers[0].terminate()
+        workers[0].join()
+
+        results = coordinator.run_trials(board, seeds)
+    stop(workers)
+
+    assert results == montecarlo.run_trials(board, seeds, summary=True)
+
+
+def test_trials_of_a_stalled_worker_are_run_by_another():
+    board = make_board()
+    seeds = montecarlo.trial_seeds(3, 50)
+
+    with cluster.Coordinator(authkey=AUTHKEY, chunk_size=7, task_timeout=2) as coordinator:
+        # A worker that takes trials but never answers, given the first range
+        stalled = Client(coordinator.address, authkey=AUTHKEY)
+        wait_for_workers(coordinator, 1)
+
+        workers = cluster.start_workers(coordinator.address, AUTHKEY, processes=2)
+        wait_for_workers(coordinator, 3)
+        results = coordinator.run_trials(board, seeds)
+    stop(workers)
+
+    assert stalled.recv()[0] == 'job'
+    assert stalled.recv()[:3] == ('range', 1, 0)
+    stalled.close()
+
+    assert results == montecarlo.run_trials(board, seeds, summary=True)
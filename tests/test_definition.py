@@ -0,0 +1,55 @@
+import kanban_simulator.board as kb
+from kanban_simulator import definition
+from kanban_simulator.distributions import UniformInt
+
+
+def make_board():
+    split = UniformInt(3, 8, seed=3)
+
+    lane = kb.Lane("Team 1", [
+        kb.Column("Discovery", touch=UniformInt(1, 4, seed=1), wip_limit=1, card_type=kb.Epic),
+        kb.SublaneColumn("Build", kb.Lane("Build", [
+            kb.Column("Development", touch=UniformInt(1, 4, seed=1), wip_limit=2, card_type=kb.Story),
+            kb.Column("Test", touch=UniformInt(1, 2), wip_limit=2, card_type=kb.Story),
+        ]), wip_limit=1, card_type=kb.Epic),
+    ], wip_limit=2)
+
+    return kb.Board(
+        name="Test",
+        lanes=[lane.clone(name="Team 1"), lane.clone(name="Team 2")],
+        backlog=kb.Backlog(cards=[kb.Epic("Epic %d" % i, splits={'Build': split}) for i in range(6)]),
+    )
+
+
+def days(board):
+    return [r.day for r in board.run_monte_carlo_simulation(trials=20, seed=7, summary=True)]
+
+
+def test_round_trip_keeps_monte_carlo_results():
+    board = make_board()
+    expected = days(board)
+
+    assert days(definition.from_json(definition.to_json(board))) == expected
+    assert days(definition.from_json(definition.to_json(board, sort_keys=True))) == expected
+
+
+def test_round_trip_shares_only_distributions_that_were_shared():
+    loaded = definition.from_json(definition.to_json(make_board()))
+
+    epics = loaded.backlog.cards
+    assert all(e.splits['Build'] is epics[0].splits['Build'] for e in epics)
+
+    discovery = [lane.columns[0].touch for lane in loaded.lanes]
+    development = [lane.columns[1].lane_template.columns[0].touch for lane in loaded.lanes]
+    assert discovery[0] is discovery[1]
+    assert development[0] is development[1]
+    assert discovery[0] == development[0]
+    assert discovery[0] is not development[0]
+
+
+def test_instrumented_board_saves_like_the_board():
+    board = make_board()
+    expected = definition.to_dict(board)
+
+    board.instrument()
+    assert definition.to_dict(board) == expected
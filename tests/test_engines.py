@@ -0,0 +1,162 @@
+import random
+
+import pytest
+
+import kanban_simulator.board as kb
+from kanban_simulator import montecarlo
+
+
+class Bug(kb.Card):
+    pass
+
+
+def mixed_board():
+    """Lanes that take different card types from a shared backlog
+    """
+
+    def lane(name, card_type):
+        return kb.Lane(name, wip_limit=4, columns=[
+            kb.Column("Triage", touch=lambda card: random.randint(1, 3), wip_limit=2, card_type=card_type),
+            kb.QueueColumn("Ready", wip_limit=2, card_type=card_type),
+            kb.Column("Build", touch=lambda card: random.randint(2, 5), wip_limit=3),
+        ])
+
+    cards = [Bug("Bug %d" % i) if i % 3 == 0 else kb.Story("Story %d" % i) for i in range(30)]
+    return kb.Board("Mixed", [lane("Bugs", Bug), lane("Stories", kb.Story), lane("Any", None)], kb.Backlog(cards=cards))
+
+
+def nested_board():
+    """Epics that split into stories in sub-lanes with a shared WIP limit
+    """
+
+    lane = kb.Lane("Team", wip_limit=3, columns=[
+        kb.Column("Discovery", touch=lambda card: random.randint(1, 4), wip_limit=2, card_type=kb.Epic),
+        kb.SublaneColumn("Build", kb.Lane("Build", [
+            kb.SharedWIPColumn("Dev and test", [
+                kb.Column("Development", touch=lambda card: random.randint(1, 4), wip_limit=2, card_type=kb.Story),
+                kb.Column("Test", touch=lambda card: random.randint(1, 2), wip_limit=2, card_type=kb.Story),
+            ], wip_limit=3),
+        ]), wip_limit=2, card_type=kb.Epic),
+        kb.Column("Release", touch=lambda card: random.randint(1, 2), wip_limit=2, card_type=kb.Epic),
+    ])
+
+    epics = [kb.Epic("Epic %d" % i, splits={'Build': lambda card: random.randint(2, 6)}) for i in range(8)]
+    return kb.Board("Nested", [lane.clone(name="Team 1"), lane.clone(name="Team 2")], kb.Backlog(cards=epics))
+
+
+def generated_board():
+    """A backlog that makes cards as they arrive, with long touch times
+    """
+
+    lane = kb.Lane("Support", wip_limit=3, columns=[
+        kb.Column("Investigate", touch=lambda card: random.randint(3, 10), wip_limit=2),
+        kb.Column("Fix", touch=lambda card: random.randint(5, 20), wip_limit=2),
+    ])
+
+    backlog = kb.GeneratedBacklog(
+        factory=lambda number, day: kb.Card("Request %d" % number),
+        arrivals=lambda day: random.randint(0, 1),
+        limit=20,
+    )
+    return kb.Board("Service desk", [lane], backlog)
+
+
+BOARDS = [mixed_board, nested_board, generated_board]
+
+
+def outcome(board, seed, engine):
+    day, result = montecarlo.run_trial(board, seed, engine=engine)
+    return day, [(c.name, c.age, c.touch) for c in result.donelog.cards]
+
+
+@pytest.mark.parametrize('make_board', BOARDS)
+def test_event_engine_matches_tick_engine(make_board):
+    board = make_board()
+
+    for seed in montecarlo.trial_seeds(1, 10):
+        assert outcome(board, seed, 'event') == outcome(board, seed, 'tick')
+
+
+# Days taken for seeds 0 to 4, and the order cards finished for seed 0, by
+# the simulator before columns indexed their cards by touch completion and
+# lanes counted their WIP incrementally
+RECORDED = {
+    mixed_board: ([22, 22, 24, 22, 21], [
+        'Story 4', 'Story 1', 'Story 2', 'Story 7', 'Bug 0', 'Bug 3', 'Story 5', 'Bug 6', 'Story 10', 'Bug 9',
+        'Story 8', 'Story 11', 'Story 13', 'Story 14', 'Bug 12', 'Story 16', 'Story 20', 'Bug 15', 'Bug 18',
+        'Story 17', 'Story 19', 'Story 22', 'Bug 21', 'Bug 24', 'Story 23', 'Story 25', 'Story 26', 'Bug 27',
+        'Story 28', 'Story 29',
+    ]),
+    nested_board: ([30, 35, 25, 33, 28], [
+        'Epic 0', 'Epic 2', 'Epic 3', 'Epic 1', 'Epic 5', 'Epic 7', 'Epic 6', 'Epic 4',
+    ]),
+}
+
+
+@pytest.mark.parametrize('engine', ['tick', 'event'])
+@pytest.mark.parametrize('make_board', sorted(RECORDED, key=lambda f: f.__name__))
+def test_engines_match_recorded_results(make_board, engine):
+    days, done = RECORDED[make_board]
+
+    results = []
+    for seed in range(5):
+        random.seed(seed)
+        results.append(make_board().run_simulation(engine=engine))
+
+    assert [day for day, board in results] == days
+    assert [card.name for card in results[0][1].donelog.cards] == done
+
+
+def column_load(column):
+    if isinstance(column, kb.SublaneColumn):
+        return sum(lane_load(lane) for lane in column.lanes)
+    if isinstance(column, kb.SharedWIPColumn):
+        return sum(column_load(c) for c in column.columns)
+    return len(column.cards)
+
+
+def lane_load(lane):
+    load = sum(column_load(c) for c in lane.columns)
+    if getattr(lane.backlog, 'owner', None) is lane:
+        load += len(lane.backlog.cards)
+    return load
+
+
+def check_counts(lane):
+    assert lane._wip == sum(len(c.cards) for c in lane.columns)
+    assert lane._load == lane_load(lane)
+
+    for column in lane.columns:
+        assert column._load == column_load(column)
+        if isinstance(column, kb.SharedWIPColumn):
+            assert column._wip == sum(len(c.cards) for c in column.columns)
+        if isinstance(column, kb.SublaneColumn):
+            for sublane in column.lanes:
+                check_counts(sublane)
+
+
+@pytest.mark.parametrize('engine', ['tick', 'event'])
+@pytest.mark.parametrize('make_board', BOARDS)
+def test_counts_match_a_recount_every_day(make_board, engine):
+    random.seed(1)
+    board = make_board()
+    days = iter(board) if engine == 'tick' else board.iter_events()
+
+    for day, board in days:
+        for lane in board.lanes:
+            check_counts(lane)
+        assert board._load == sum(lane_load(lane) for lane in board.lanes)
+
+    assert board._load == 0
+
+
+@pytest.mark.parametrize('engine', ['tick', 'event'])
+@pytest.mark.parametrize('make_board', BOARDS)
+def test_skipping_idle_lanes_matches_pulling_every_lane(make_board, engine, monkeypatch):
+    board = make_board()
+    seeds = list(montecarlo.trial_seeds(2, 10))
+
+    skipped = [outcome(board, seed, engine) for seed in seeds]
+
+    monkeypatch.setattr(kb.Lane, '_is_idle', lambda self: False)
+    assert [outcome(board, seed, engine) for seed in seeds] == skipped
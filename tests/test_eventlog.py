@@ -0,0 +1,84 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import kanban_simulator.board as kb
+from kanban_simulator.distributions import UniformInt
+from kanban_simulator.eventlog import EventLog, EventLogReader
+
+
+def make_board():
+    return kb.Board(
+        name="Test",
+        lanes=[kb.Lane("Team 1", [
+            kb.Column("Analysis", touch=UniformInt(1, 3), wip_limit=2),
+            kb.Column("Development", touch=UniformInt(2, 5), wip_limit=2),
+        ])],
+        backlog=kb.Backlog(cards=[kb.Card("Card %d" % i) for i in range(6)]),
+    )
+
+
+def test_append_carries_on_trial_numbers(tmpdir):
+    path = str(tmpdir.join("trace.log"))
+
+    with EventLog(path) as log:
+        make_board().run_monte_carlo_simulation(trials=2, seed=1, summary=True, listeners=[log])
+    with EventLog(path) as log:
+        make_board().run_monte_carlo_simulation(trials=2, seed=2, summary=True, listeners=[log])
+
+    with EventLogReader(path) as reader:
+        events = [reader[i] for i in range(len(reader))]
+        assert [(e.trial, e.day) for e in events] == sorted((e.trial, e.day) for e in events)
+        assert sorted(set(e.trial for e in events)) == [0, 1, 2, 3]
+
+        for trial in range(4):
+            assert reader.query(trial=trial) == [e for e in events if e.trial == trial]
+
+
+def test_second_simulation_on_same_log(tmpdir):
+    path = str(tmpdir.join("trace.log"))
+
+    with EventLog(path) as log:
+        make_board().run_monte_carlo_simulation(trials=2, seed=1, summary=True, listeners=[log])
+        make_board().run_monte_carlo_simulation(trials=2, seed=2, summary=True, listeners=[log])
+
+    with EventLogReader(path) as reader:
+        assert sorted(set(reader[i].trial for i in range(len(reader)))) == [0, 1, 2, 3]
+        assert len(reader.query(trial=2)) == len([i for i in range(len(reader)) if reader[i].trial == 2])
+
+
+def test_queries_match_a_scan(tmpdir):
+    path = str(tmpdir.join("trace.log"))
+
+    with EventLog(path) as log:
+        make_board().run_monte_carlo_simulation(trials=5, seed=1, summary=True, listeners=[log])
+
+    with EventLogReader(path) as reader:
+        events = [reader[i] for i in range(len(reader))]
+
+        def scan(trial=None, card=None, days=None):
+            return [
+                e for e in events
+                if (trial is None or e.trial == trial) and (card is None or e.card == card) and
+                (days is None or days[0] <= e.day <= days[1])
+            ]
+
+        for kwargs in [
+            dict(card="Card 2"),
+            dict(card="Card 2", trial=3),
+            dict(card="Card 2", days=(3, 8)),
+            dict(card="Card 2", trial=1, days=(3, 8)),
+            dict(days=(3, 8)),
+            dict(trial=4, days=(3, 8)),
+            dict(trial=2),
+            dict(card="No such card"),
+            dict(),
+        ]:
+            expected = scan(**kwargs)
+            assert reader.query(**kwargs) == expected
+
+            if numpy is not None:
+                records = reader.array(**kwargs)
+                assert [(r['trial'], r['day']) for r in records] == [(e.trial, e.day) for e in expected]
+                del records